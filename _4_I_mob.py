@@ -8,14 +8,9 @@ See the GNU Affero General Public License for more details: <https://www.gnu.org
 import streamlit as st
 import pandas as pd
 import numpy as np
-import pint
-from welly import Well
-from welly import Curve
-
-import stresslog as lsd
 #st.set_page_config(layout="wide")
 
-from common_functions import create_well_log_plot, resample_well, getwelldev, load_aliases, save_aliases, get_missing_aliases, get_df_from_user
+from common_functions import cached_well_log_plot, read_las_string, read_las, session_deviated_well, resolve_aliases, suggest_aliases, first_suggestions, curve_info, header_well_info, frame_axes, alias_user, load_aliases, save_aliases, get_df_from_user
 import random
 
 # Streamlit implementation
@@ -28,10 +23,10 @@ def mobile_import():
 
     # Initialize session state for aliases
     if 'aliases' not in st.session_state:
-        st.session_state.aliases = load_aliases()
+        st.session_state.aliases = load_aliases(alias_user())
 
     if 'alias' not in st.session_state:
-        st.session_state.alias = load_aliases()#st.session_state.aliases
+        st.session_state.alias = load_aliases(alias_user())#st.session_state.aliases
         
     if 'aliasState' not in st.session_state:
         st.session_state.aliasState = False # All critical aliases set correctly
@@ -58,6 +53,7 @@ def mobile_import():
 
 
     vert_height = 685
+    depth_range = None
     st.session_state.refresher=False
 
 
@@ -73,7 +69,7 @@ def mobile_import():
     #with st.sidebar:
     #@st.dialog("Aliases and Check Plot Config")
     if st.session_state.las_file is None:
-        st.session_state.las_file = st.file_uploader("Upload a LAS file", type=["las"])
+        st.session_state.las_file = st.file_uploader("Upload a LAS file, or a Parquet file exported from this app", type=["las", "parquet"])
         if st.button("No Las? No Problem",use_container_width=True):
             righeight=random.randint(7,75)
             gl=random.randint(-1000,1000)
@@ -81,6 +77,7 @@ def mobile_import():
                 kb = righeight
             else:
                 kb = gl+righeight
+            import stresslog as lsd
             ad,cb,stringer = lsd.create_random_las(kb=kb,gl=gl,drop=['RHOB'])
             st.session_state.las_file = stringer
 
@@ -156,31 +153,17 @@ def mobile_import():
 
         if st.session_state.las_file is not None:
             #st.session_state.las_file = uploaded_file
-            # Pass the file-like object directly to Well.from_las()
-            try:
-                byteme = st.session_state.las_file.getvalue()
-                string_data = byteme.decode('utf-8', errors='replace')
-            except:
-                string_data = st.session_state.las_file.getvalue()
-            well = Well.from_las(string_data)
+            # Parse once per file content, reruns with the same file are served from cache
+            las_digest, string_data = read_las_string(st.session_state.las_file)
+            well, st.session_state.curve_data = read_las(las_digest, string_data)
+            st.session_state.curve_version = las_digest
             st.session_state.wellobj = well
-            st.session_state.curve_data = well.df()
-            curves = st.session_state.wellobj.df()
+            depth_index, curve_names = frame_axes(st.session_state.curve_data)
             
             with st.container():
                 # Evaluate required aliases before drawing the widget
-                curves_list = list(st.session_state.curve_data)
                 aliases = st.session_state.aliases
-                result_dict = {}
-                no_match_keys = []
-
-                # Process each alias group
-                for key, alias_group in aliases.items():
-                    match = next((curve for curve in alias_group if curve in curves_list), 'None')
-                    result_dict[key] = match
-                    if match == "None" or match is None:
-                        no_match_keys.append(key)
-                missing_aliases = no_match_keys
+                result_dict, missing_aliases = resolve_aliases(aliases, curve_names, curve_info(well))
 
                 # Conditions for required aliases
                 single_aliases = ["sonic", "resdeep"]  # These should be set individually
@@ -198,18 +181,28 @@ def mobile_import():
                         current_selection = st.session_state.aliases.get(alias, [])
                         new_selection = st.multiselect(
                             f"Select curve for {alias.upper()}",
-                            options=["None"] + list(st.session_state.curve_data.columns),
+                            options=["None"] + list(curve_names),
                             default=[
                                 value
                                 for value in st.session_state.aliases.get(alias, ["None"])
-                                if value in ["None"] + list(st.session_state.curve_data.columns)
+                                if value in ["None"] + list(curve_names)
                             ],
                         )
-                        updated_selection = list(set(current_selection + new_selection))
+                        updated_selection = current_selection + [value for value in new_selection if value not in current_selection]
                         st.session_state.aliases[alias] = updated_selection
 
-                    # Save updated aliases to JSON
-                    save_aliases(st.session_state.aliases)
+                    # Save updated aliases to JSON, the file is only written when they changed
+                    save_aliases(st.session_state.aliases, alias_user())
+
+                    # Curves that look like a missing alias, such as DTCO_1 for DTCO
+                    suggestions = suggest_aliases(aliases, missing_aliases, curve_names, curve_info(well))
+                    if suggestions:
+                        st.caption("Similar curves: " + "; ".join(f"{alias.upper()}: {', '.join(names)}" for alias, names in suggestions.items()))
+                        if st.button("Add the first similar curve of each", use_container_width=True):
+                            for alias, name in first_suggestions(suggestions).items():
+                                st.session_state.aliases[alias] = st.session_state.aliases.get(alias, []) + [name]
+                            save_aliases(st.session_state.aliases, alias_user())
+                            st.rerun()
 
                     st.session_state.alias = result_dict
                     st.write(st.session_state.alias)
@@ -241,7 +234,7 @@ def mobile_import():
                 if 'curve_data' in st.session_state and st.session_state.curve_data is not None:
                     #st.subheader("Visualization Settings")
                     
-                    available_curves = list(st.session_state.curve_data.columns)
+                    available_curves = list(curve_names)
                     try:
                         available_curves.remove('DEPT')
                     except:
@@ -251,6 +244,12 @@ def mobile_import():
                         vert_height = st.number_input(
                             "Set plot height in pixels", value=3000, placeholder="How tall you want the plot?"
                         )
+                        top_depth = float(np.nanmin(depth_index.values))
+                        bottom_depth = float(np.nanmax(depth_index.values))
+                        depth_range = st.slider(
+                            "Depth window", min_value=top_depth, max_value=bottom_depth, value=(top_depth, bottom_depth),
+                            help="Zoom the plot to a depth interval, the curves are redrawn in full detail for it"
+                        )
                     
 
 
@@ -371,37 +370,7 @@ def mobile_import():
             #st.session_state.data_array[0]
             # Initialize well_info dictionary in session state if not exists
             if 'well_info' not in st.session_state:
-                olakb=1
-                olagl=0
-
-                try:
-                    olakb=st.session_state.wellobj.header.set_index("mnemonic").loc["KB", "value"]
-                except:
-                    pass
-                try:
-                    olakb=st.session_state.wellobj.header.set_index("mnemonic").loc["EKB", "value"]
-                except:
-                    pass
-                try:
-                    olagl=st.session_state.wellobj.header.set_index("mnemonic").loc["GL", "value"]
-                except:
-                    pass
-                try:
-                    olagl=st.session_state.wellobj.header.set_index("mnemonic").loc["EGL", "value"]
-                except:
-                    pass
-                st.session_state.well_info = {
-                    'Well Name': getattr(well, 'name', '') or '',
-                    'Well UWI/API': getattr(well, 'uwi', '') or getattr(well, 'api', '') or '',
-                    'Kelly Bushing Elevation': str(olakb),
-                    'Ground Level Elevation': str(olagl),
-                    'Water Table Elevation': '0',
-                    'Bottom Hole Temperature': '',
-                    'Latitude': str(getattr(well.location, 'lat', '') or ''),
-                    'Longitude': str(getattr(well.location, 'lon', '') or ''),
-                    'Mud resistance': '',
-                    'Mud Filtrate Resistance': ''
-                }
+                st.session_state.well_info = header_well_info(well)
             
             # Create a form with two columns and 5 rows
             with st.form(key='well_info_form'):
@@ -448,14 +417,8 @@ def mobile_import():
             #st.session_state.wellobj.location.add_deviation(st.session_state.data_array[0])
             #fullwell = getwelldev(string_data,st.session_state.data_array[0])
             step = 5
-            st.session_state.wellobj = getwelldev(wella=resample_well(string_las=string_data,step=step),deva=st.session_state.data_array[0],step=step)#resample_well(fullwell,5)
-            neutron = st.session_state.wellobj.data[st.session_state.alias['neutron']].values
-            corneu = neutron/100 if np.nanmean(neutron)>1 else neutron
-            md = st.session_state.wellobj.data["MD"].values
-            st.session_state.wellobj.data[st.session_state.alias['neutron']] = Curve(corneu, mnemonic=st.session_state.alias['neutron'],units='v/v', index=md, null=-999.25)
-
-            #st.session_state.wellobj.location
-            traj = st.session_state.wellobj.location.trajectory()
+            st.session_state.wellobj = session_deviated_well(las_digest, string_data, step, st.session_state.data_array[0], st.session_state.alias['neutron'])
+
             # Process form submission
             if submit_button:
                 if st.session_state.aliasState:
@@ -465,13 +428,11 @@ def mobile_import():
                 #st.write(st.session_state.well_info)
             #st.write(well.location.ekb)
             
-            # Ensure DEPT column exists and is properly named
-            if 'DEPT' not in curves.columns and curves.index.name == 'DEPT':
-                curves = curves.reset_index()
 
         if st.session_state.las_file is not None:
             try:
-                fig = create_well_log_plot(
+                fig = cached_well_log_plot(
+                    st.session_state.curve_version,
                     st.session_state.curve_data,
                     custom_tracks,
                     track_curve_ranges,
@@ -481,10 +442,13 @@ def mobile_import():
                     vert_height,
                     style='linear',
                     halftrack=0.35,
-                    gap=5
+                    gap=5,
+                    depth_range=depth_range
                 )
                 
                 #fig.update_yaxes(row=2,range = [st.session_state.curve_data.index.max(),st.session_state.curve_data.index.min()])
+                if depth_range is not None:
+                    fig.update_yaxes(row=2,range = [max(depth_range),min(depth_range)],autorange=False)
                 fig.update_layout(
                     dragmode=False,
                     xaxis=dict(fixedrange=True),
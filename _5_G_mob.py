@@ -7,8 +7,8 @@ See the GNU Affero General Public License for more details: <https://www.gnu.org
 
 import streamlit as st
 import pandas as pd
-import stresslog as lsd
-from common_functions import create_well_log_plot, resample_well, getwelldev, load_aliases, save_aliases, get_missing_aliases, get_df_from_user
+from geomech import geomech_parameters, well_fingerprint
+from common_functions import cached_well_log_plot, geomech_inputs, submit_geomech, start_geomech, collect_geomech, show_geomech_progress, parameter_sweep, calibration_optimizer, get_df_from_user
 clearflag=True
 df=None
 bs=None
@@ -18,6 +18,8 @@ if 'constraints' not in st.session_state:
 
 if 'outputdata' not in st.session_state:
     st.session_state.outputdata = [None,None,None,None,None,None,None]
+if 'outputversion' not in st.session_state:
+    st.session_state.outputversion = None
 
 if 'lastdoi' not in st.session_state:
     st.session_state.lastdoi = 0
@@ -38,56 +40,30 @@ def mobile_geomech(defaults):
         st.switch_page("_1_Import.py")
 
     with st.form(key='model_parameters'):
-        has_changed = False
+        changed = []
         
         # Check for changes
         for key in defaults.keys():
             if st.session_state.get(f"{key}_input", st.session_state[key]) != st.session_state[key]:
                 st.session_state[key] = st.session_state[f"{key}_input"]
-                has_changed = True
+                changed.append(key)
+        has_changed = bool(changed)
 
         # Form submit 1
-        if st.form_submit_button(label='Recalculate', use_container_width=True) or has_changed or st.session_state.outputdata[0] is None:
-            if st.session_state.mudattributedf is not None:
-                mwvalues = st.session_state.mudattributedf[["MaxMudWeight", "Shoe Depth", "Bit Dia", "Casing Dia", "Mud Motor ID", "Section BHT"]].apply(
-                    lambda col: (
-                        col.astype(float).fillna(1.0) if col.name == "Max MudWeight"
-                        else col.astype(float).fillna(0.0)
-                        if col.name != "Mud Motor ID"
-                        else col.replace({None: "0"}).fillna("0")
-                    )
-                ).values.tolist()
-            else:
-                mwvalues = [[1.0, 0.0, 0.0, 0.0, 0.0, 0]]
-            attrib = [float(st.session_state.well_info.get(key, "0") or "0") for key in [
-                "Kelly Bushing Elevation",
-                "Ground Level Elevation",
-                "Water Table Elevation",
-                "Latitude",
-                "Longitude",
-                "Bottom Hole Temperature",
-                "Mud resistance",
-                "Mud Filtrate Resistance"
-            ]]
-
-            st.session_state.outputdata[0], st.session_state.outputdata[1], st.session_state.outputdata[2], st.session_state.outputdata[3], st.session_state.outputdata[4], st.session_state.outputdata[5], st.session_state.outputdata[6],st.session_state.lastdoi = lsd.plotPPzhang(
-                st.session_state.wellobj, rhoappg=st.session_state.rhoappg, lamb=st.session_state.lamb,
-                ul_exp=st.session_state.lamb if st.session_state.ul_depth == 0 else st.session_state.ul_exp,
-                ul_depth=st.session_state.ul_depth, a=st.session_state.a,
-                nu=st.session_state.nu, sfs=st.session_state.sfs, window=1, zulu=0, tango=20000,
-                dtml=st.session_state.dtml, dtmt=st.session_state.dtmt, water=st.session_state.water,
-                underbalancereject=st.session_state.underbalancereject, tecb=st.session_state.tecb,
-                doi=0.0, lala=st.session_state.lala, lalb=st.session_state.lalb,
-                lalm=st.session_state.lalm, lale=st.session_state.lale, lall=st.session_state.lall,
-                horsuda=st.session_state.horsuda, horsude=st.session_state.horsude,
-                offset=st.session_state.offset, strike=st.session_state.strike, dip=st.session_state.dip, mudtemp=st.session_state.mudtemp,
-                mwvalues=mwvalues, forms=st.session_state.data_array[1],
-                flags=st.session_state.data_array[4], lithos=st.session_state.data_array[3],writeFile=False,attrib=attrib,aliasdict={key: [value] for key, value in st.session_state.alias.items()},
-                program_option=[300,st.session_state.program_option,0,0,0],
-                res0=st.session_state.res0, be=st.session_state.be, ne=st.session_state.ne,
-                dex0=st.session_state.dex0, de=st.session_state.de, nde=st.session_state.nde,
+        if st.form_submit_button(label='Recalculate', use_container_width=True) or has_changed or st.session_state.pop("recalculate", False) or (st.session_state.outputdata[0] is None and st.session_state.get("geomech_job") is None):
+            inputs = geomech_inputs(st.session_state.mudattributedf, st.session_state.well_info, st.session_state.alias)
+            start_geomech(
+                submit_geomech(
+                    well_fingerprint(st.session_state.wellobj), st.session_state.wellobj, geomech_parameters(st.session_state),
+                    inputs["mwvalues"], inputs["attrib"], inputs["aliasdict"],
+                    forms=st.session_state.data_array[1], flags=st.session_state.data_array[4], lithos=st.session_state.data_array[3],
+                    doi=st.session_state.doi,
+                ),
+                doi_only=changed == ["doi"] and st.session_state.outputdata[0] is not None,
             )
 
+        collected = collect_geomech()
+
         with st.expander("Pore Pressure Zhang Parameters", expanded=False):
             # Compaction Parameters
             ppoptions = [
@@ -315,43 +291,14 @@ def mobile_geomech(defaults):
             pass
     #st.session_state.data_array[5]
     #result_dict
+    with st.expander("Parameter Sweep", expanded=False):
+        parameter_sweep()
+    with st.expander("Calibration Optimizer", expanded=False):
+        calibration_optimizer()
     # Form submit 2
-    if st.button(label=f"Detailed Analysis", use_container_width=True) or has_changed or st.session_state.outputdata[3] is None:
-        if st.session_state.mudattributedf is not None:
-            mwvalues = st.session_state.mudattributedf[["MaxMudWeight", "Shoe Depth", "Bit Dia", "Casing Dia", "Mud Motor ID", "Section BHT"]].apply(
-                lambda col: (
-                    col.astype(float).fillna(1.0) if col.name == "Max MudWeight"
-                    else col.astype(float).fillna(0.0)
-                    if col.name != "Mud Motor ID"
-                    else col.replace({None: "0"}).fillna("0")
-                )
-            ).values.tolist()
-        else:
-            mwvalues = [[1.025, 0.0, 0.0, 0.0, 0.0, 0]]
-        #st.session_state.lastdoi
-        if st.session_state.lastdoi != st.session_state.doi and has_changed:
-            st.session_state.outputdata[0], st.session_state.outputdata[1], st.session_state.outputdata[2], st.session_state.outputdata[3], st.session_state.outputdata[4], st.session_state.outputdata[5], st.session_state.outputdata[6],st.session_state.lastdoi = lsd.plotPPzhang(
-                st.session_state.wellobj, rhoappg=st.session_state.rhoappg, lamb=st.session_state.lamb,
-                ul_exp=st.session_state.lamb if st.session_state.ul_depth == 0 else st.session_state.ul_exp,
-                ul_depth=st.session_state.ul_depth, a=st.session_state.a,
-                nu=st.session_state.nu, sfs=st.session_state.sfs, window=1, zulu=0, tango=20000,
-                dtml=st.session_state.dtml, dtmt=st.session_state.dtmt, water=st.session_state.water,
-                underbalancereject=st.session_state.underbalancereject, tecb=st.session_state.tecb,
-                doi=0.0, lala=st.session_state.lala, lalb=st.session_state.lalb,
-                lalm=st.session_state.lalm, lale=st.session_state.lale, lall=st.session_state.lall,
-                horsuda=st.session_state.horsuda, horsude=st.session_state.horsude,
-                offset=st.session_state.offset, strike=st.session_state.strike, dip=st.session_state.dip, mudtemp=st.session_state.mudtemp,
-                mwvalues=mwvalues, forms=st.session_state.data_array[1],
-                flags=st.session_state.data_array[4], lithos=st.session_state.data_array[3],writeFile=False,attrib=attrib,aliasdict={key: [value] for key, value in st.session_state.alias.items()},
-                program_option=[300,st.session_state.program_option,0,0,0],
-                res0=st.session_state.res0, be=st.session_state.be, ne=st.session_state.ne,
-                dex0=st.session_state.dex0, de=st.session_state.de, nde=st.session_state.nde,
-            )
-            if st.session_state.outputdata[2] is not None:
-                detailed_analysis()
-        else:
-            if st.session_state.outputdata[2] is not None:
-                detailed_analysis()
+    if st.button(label=f"Detailed Analysis", use_container_width=True) or collected or st.session_state.outputdata[3] is None:
+        if st.session_state.outputdata[2] is not None:
+            detailed_analysis()
     
     
     if st.button("Load/Edit UCS Calibration data", use_container_width=True):
@@ -370,6 +317,7 @@ def mobile_geomech(defaults):
         st.switch_page("_3_Export.py")
     #df
     #with cols[1]:
+    show_geomech_progress()
     if st.session_state.outputdata[0] is not None:
         #with st.container(height=719):
         default_tracks = [[st.session_state.alias['gr'],"Poisson_Ratio"],#"Poisson_Ratio"],
@@ -425,7 +373,8 @@ def mobile_geomech(defaults):
         }
         tgs=[{"show":False,"values":[]},{"show":False,"values":[]},{"show":False,"values":[]},{"show":False,"values":[]},{"show":False,"values":[]}]
         vert_height=719
-        fig = create_well_log_plot(
+        fig = cached_well_log_plot(
+                    st.session_state.outputversion,
                     st.session_state.outputdata[0],
                     default_tracks,
                     default_curve_ranges,
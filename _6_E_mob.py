@@ -6,11 +6,9 @@ See the GNU Affero General Public License for more details: <https://www.gnu.org
 """
 
 import streamlit as st
-import io
+from functools import partial
+from common_functions import expand_frame, export_csv, export_excel, excel_note, export_parquet, export_las
 
-def convert_df(df):
-    # IMPORTANT: Cache the conversion to prevent computation on every rerun
-    return df.to_csv().encode("utf-8")
 
 def mobile_export():
     if 'outputdata' in st.session_state and st.session_state.outputdata[0] is not None:
@@ -21,38 +19,44 @@ def mobile_export():
             st.title("EXPORT DATA")
             if st.button('Back to Calculations',type="primary", use_container_width=True):
                         st.switch_page("_2_Geomech.py")
-            csv = convert_df(st.session_state.outputdata[0])
+            # The files are only built when their button is clicked, once per model run
+            output = (st.session_state.get("outputversion"), st.session_state.outputdata[0])
 
             st.download_button(
                 label="Download data as CSV",
-                data=csv,
+                data=partial(export_csv, *output),
                 file_name="large_df.csv",
                 mime="text/csv",
+                on_click="ignore",
                 use_container_width=True
             )
             
-            buffer = io.BytesIO()
-            st.session_state.outputdata[0].to_excel(buffer, index=False)
-            buffer.seek(0)
-            excel_data = buffer.getvalue()
-
             st.download_button(
                 label="Download data as Excel",
-                data=excel_data,
-                file_name="WellData.xslx",
-                mime="text/csv",
+                data=partial(export_excel, *output),
+                file_name="WellData.xlsx",
+                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                on_click="ignore",
                 use_container_width=True
             )
-           
-            # Streamlit download button
-            #st.session_state.outputdata[1]
-            las_content = st.session_state.outputdata[1]
+            st.caption(excel_note(*output))
 
+            st.download_button(
+                label="Download data as Parquet",
+                data=partial(export_parquet, *output, st.session_state.outputdata[1]),
+                file_name="WellData.parquet",
+                mime="application/vnd.apache.parquet",
+                on_click="ignore",
+                use_container_width=True
+            )
+           
+            # Streamlit download button, the LAS is written from the output table when clicked
             st.download_button(
                 label="Download Processed LAS File",
-                data=las_content,
+                data=partial(export_las, st.session_state.outputdata[0], st.session_state.outputdata[1]),
                 file_name="well_data.las",
                 mime="text/plain",
+                on_click="ignore",
                 use_container_width=True
             )
             "---"
@@ -63,4 +67,4 @@ def mobile_export():
                     
         #with cols[1]:
             #with st.container(height=724):    
-            st.write(st.session_state.outputdata[0])
+            st.write(expand_frame(st.session_state.outputdata[0]))
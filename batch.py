@@ -0,0 +1,253 @@
+"""
+Copyright (c) 2024-2025 ROCK LAB PRIVATE LIMITED
+This file is part of "The Stress App" project and is released under the
+GNU Affero General Public License v3.0 (AGPL-3.0)
+See the GNU Affero General Public License for more details: <https://www.gnu.org/licenses/agpl-3.0.html>
+"""
+
+# Headless batch runs of the Import -> Geomech -> Export pipeline over a directory of LAS files:
+#
+#     python batch.py LAS_DIR OUT_DIR --params params.json
+#
+# The parameter file is JSON. It takes any of the Geomech page parameters (lamb, nu, tecb, doi, ...)
+# plus the optional keys "step" (resampling interval in m, default 5), "well_info" (overrides of
+# the well info fields on the import page) and "mud" (rows of the casing, bit and mud table).
+# A deviation survey with MD, INC and AZIM columns is read from <name>_dev.csv next to a LAS
+# file when present, otherwise the well is taken as vertical.
+# Each well is written to OUT_DIR as <name>.csv and <name>.las by its own worker process, so a
+# well that crashes or runs past --timeout only fails itself. The files are written under a
+# .partial suffix and renamed once both are complete; a failed well leaves no output behind.
+# --workers wells run at once, and OUT_DIR/summary.csv lists the outcome of every well.
+
+import argparse
+import contextlib
+import io
+import json
+import multiprocessing
+import multiprocessing.connection
+import os
+import sys
+import time
+import warnings
+from pathlib import Path
+
+import pandas as pd
+from welly import Well
+from streamlit import logger
+
+# Outside a streamlit server the cached helpers warn that there is no runtime
+logger.set_log_level("error")
+
+# The app loads stresslog on first use; here every well needs it, so load it once before forking the workers
+import stresslog
+from geomech import GEOMECH_DEFAULTS, MUD_COLUMNS, geomech_parameters, run_inputs, run_geomech, las_chunks
+from common_functions import resample_well, getwelldev, resolve_aliases, curve_info, header_well_info, neutron_to_fraction, load_aliases
+
+def load_settings(path=None):
+    """
+    Read a batch parameter file.
+
+    Parameters:
+        path (str): JSON parameter file, or None for the defaults.
+
+    Returns:
+        dict: parameters, step, well_info and mud (DataFrame or None).
+    """
+    settings = {}
+    if path is not None:
+        with open(path, "r") as jsonfile:
+            settings = json.load(jsonfile)
+    step = settings.pop("step", 5)
+    well_info = settings.pop("well_info", {})
+    mud = settings.pop("mud", None)
+    unknown = [key for key in settings if key not in GEOMECH_DEFAULTS]
+    if unknown:
+        raise ValueError(f"Unknown parameters in {path}: {', '.join(unknown)}")
+    return {
+        "parameters": {**GEOMECH_DEFAULTS, **settings},
+        "step": step,
+        "well_info": {key: str(value) for key, value in well_info.items()},
+        "mud": None if mud is None else pd.DataFrame(mud, columns=MUD_COLUMNS),
+    }
+
+def las_files(las_dir):
+    """
+    Yield the LAS files in a directory, in name order.
+    """
+    for path in sorted(Path(las_dir).iterdir()):
+        if path.is_file() and path.suffix.lower() == ".las":
+            yield path
+
+# Suffix of output files still being written
+PARTIAL_SUFFIX = ".partial"
+
+def output_paths(path, out_dir):
+    """
+    The CSV and LAS files a well is written to.
+    """
+    return [os.path.join(out_dir, f"{path.stem}{suffix}") for suffix in [".csv", ".las"]]
+
+def remove_partial(path, out_dir):
+    """
+    Delete the output files a well left half written.
+    """
+    for output in output_paths(path, out_dir):
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(output + PARTIAL_SUFFIX)
+
+def process_well(path, out_dir, settings, aliases, verbose=False):
+    """
+    Run one LAS file through the pipeline and write its outputs.
+
+    Parameters:
+        path (Path): The LAS file.
+        out_dir (str): Directory for <name>.csv and <name>.las.
+        settings (dict): Output of load_settings().
+        aliases (dict): Alias name to candidate mnemonics.
+        verbose (bool): Let the model print its progress.
+
+    Returns:
+        int: Number of output samples.
+    """
+    string_las = path.read_bytes().decode('utf-8', errors='replace')
+    well = Well.from_las(string_las, index="m")
+    alias, missing = resolve_aliases(aliases, well.data.keys(), curve_info(well))
+    if all(key in missing for key in ["sonic", "resdeep"]) and any(key in missing for key in ["WOB", "ROP", "RPM", "ECD"]):
+        raise ValueError("no sonic, deep resistivity or complete drilling data curves found")
+    well_info = {**header_well_info(well), **settings["well_info"]}
+
+    deviation_path = path.with_name(f"{path.stem}_dev.csv")
+    deviation = pd.read_csv(deviation_path) if deviation_path.exists() else None
+    step = settings["step"]
+    wella = getwelldev(wella=resample_well(well=well, step=step), deva=deviation, step=step)
+    if alias["neutron"] != "None":
+        neutron_to_fraction(wella, alias["neutron"])
+
+    inputs = run_inputs(settings["mud"], well_info, alias)
+    with contextlib.redirect_stdout(sys.stdout if verbose else io.StringIO()):
+        result = run_geomech(wella, geomech_parameters(settings["parameters"]), inputs["mwvalues"], inputs["attrib"],
+                             inputs["aliasdict"], doi=settings["parameters"]["doi"])
+    if result[0] is None:
+        raise ValueError("the model returned no results, check the aliases")
+
+    csv_path, las_path = output_paths(path, out_dir)
+    result[0].to_csv(csv_path + PARTIAL_SUFFIX)
+    with open(las_path + PARTIAL_SUFFIX, "w") as lasfile:
+        lasfile.writelines(las_chunks(result[1], result[0]))
+    os.replace(csv_path + PARTIAL_SUFFIX, csv_path)
+    os.replace(las_path + PARTIAL_SUFFIX, las_path)
+    return len(result[0])
+
+def run_worker(path, out_dir, settings, aliases, verbose, connection):
+    """
+    Process one well in a worker process and send back ("ok", samples) or ("failed", error).
+    """
+    with warnings.catch_warnings():
+        if not verbose:
+            warnings.simplefilter("ignore")
+        try:
+            connection.send(("ok", process_well(path, out_dir, settings, aliases, verbose=verbose)))
+        except Exception as error:
+            connection.send(("failed", str(error) or type(error).__name__))
+    connection.close()
+
+def run_wells(paths, out_dir, settings, aliases, workers=1, timeout=None, verbose=False):
+    """
+    Process wells in up to workers processes at a time, one process per well.
+
+    Parameters:
+        paths (iterable): LAS files, consumed lazily.
+        out_dir (str): Output directory.
+        settings (dict): Output of load_settings().
+        aliases (dict): Alias name to candidate mnemonics.
+        workers (int): Number of wells to run at once.
+        timeout (float): Seconds after which a well is killed, or None.
+        verbose (bool): Let the model print its progress.
+
+    Yields:
+        tuple: (path, status, detail, seconds) as each well finishes; status is ok, failed or timeout.
+    """
+    if "fork" in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context("fork")
+    else:
+        context = multiprocessing.get_context("spawn")
+    paths = iter(paths)
+    running = {}
+    while True:
+        while len(running) < workers:
+            path = next(paths, None)
+            if path is None:
+                break
+            receiver, sender = context.Pipe(duplex=False)
+            process = context.Process(target=run_worker, args=(path, out_dir, settings, aliases, verbose, sender), daemon=True)
+            process.start()
+            sender.close()
+            running[process] = (path, receiver, time.time())
+        if not running:
+            return
+        multiprocessing.connection.wait([process.sentinel for process in running], timeout=1)
+        for process, (path, receiver, start) in list(running.items()):
+            seconds = time.time() - start
+            if not process.is_alive():
+                process.join()
+                if receiver.poll():
+                    status, detail = receiver.recv()
+                else:
+                    status, detail = "failed", f"worker exited with code {process.exitcode}"
+            elif timeout is not None and seconds > timeout:
+                process.kill()
+                process.join()
+                status, detail = "timeout", f"no result after {timeout:g} s"
+            else:
+                continue
+            receiver.close()
+            del running[process]
+            if status != "ok":
+                remove_partial(path, out_dir)
+            yield path, status, detail, seconds
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the stress model over a directory of LAS files.")
+    parser.add_argument("las_dir", help="Directory of LAS files")
+    parser.add_argument("out_dir", help="Directory for the CSV and LAS outputs")
+    parser.add_argument("--params", help="JSON parameter file, see the top of batch.py")
+    parser.add_argument("--aliases", help="Alias file, defaults to aliases.json in the working directory")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Wells to run at once (default: number of CPUs)")
+    parser.add_argument("--timeout", type=float, help="Seconds after which a well is abandoned")
+    parser.add_argument("--verbose", action="store_true", help="Show the model's own output")
+    args = parser.parse_args(argv)
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+
+    try:
+        settings = load_settings(args.params)
+    except (OSError, ValueError) as error:
+        parser.error(str(error))
+    if args.aliases is not None:
+        with open(args.aliases, "r") as jsonfile:
+            aliases = json.load(jsonfile)
+    else:
+        aliases = load_aliases()
+    os.makedirs(args.out_dir, exist_ok=True)
+
+    start = time.time()
+    summary = []
+    for path, status, detail, seconds in run_wells(las_files(args.las_dir), args.out_dir, settings, aliases,
+                                                   workers=args.workers, timeout=args.timeout, verbose=args.verbose):
+        if status == "ok":
+            print(f"{path.name}: {detail} samples in {seconds:.1f} s")
+        else:
+            print(f"{path.name}: {status}, {detail}", file=sys.stderr)
+        summary.append({"well": path.name, "status": status, "detail": detail, "seconds": round(seconds, 2)})
+
+    elapsed = time.time() - start
+    failed = [row for row in summary if row["status"] != "ok"]
+    pd.DataFrame(summary, columns=["well", "status", "detail", "seconds"]).to_csv(os.path.join(args.out_dir, "summary.csv"), index=False)
+    print(f"{len(summary)} wells in {elapsed:.1f} s with {args.workers} workers "
+          f"({len(summary) / elapsed * 60 if elapsed else 0:.1f} wells/min), {len(failed)} failed")
+    for row in failed:
+        print(f"  {row['well']}: {row['status']}, {row['detail']}")
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,175 @@
+"""
+Copyright (c) 2024-2025 ROCK LAB PRIVATE LIMITED
+This file is part of "The Stress App" project and is released under the
+GNU Affero General Public License v3.0 (AGPL-3.0)
+See the GNU Affero General Public License for more details: <https://www.gnu.org/licenses/agpl-3.0.html>
+"""
+
+# Misfit of model runs against calibration data, kept free of streamlit so worker processes can import it
+
+import itertools
+import time
+from concurrent.futures import wait
+import pandas as pd
+import numpy as np
+from geomech import run_geomech
+
+# Output curve each constraint type is compared with
+CONSTRAINT_CURVES = {
+    "Fracture Gradient": "FracGrad",
+    "Pore Pressure Gradient": "PP_GRADIENT",
+    "Fracture Pressure": "FracPressure",
+    "Pore Pressure": "GEOPRESSURE",
+    "UCS": "UCS_Horsud",
+}
+
+def calibration_points(constraints, ucs=None):
+    """
+    Collect the constraints table and the UCS calibration data into one table.
+
+    Parameters:
+        constraints (DataFrame): Rows of MD, Value and Type from the Geomech page.
+        ucs (DataFrame): Rows of MD and UCS, or None.
+
+    Returns:
+        DataFrame: MD, Value and Type of every complete row.
+    """
+    tables = []
+    if constraints is not None:
+        tables.append(constraints[["MD", "Value", "Type"]])
+    if ucs is not None:
+        tables.append(pd.DataFrame({"MD": ucs["MD"], "Value": ucs["UCS"], "Type": "UCS"}))
+    if not tables:
+        return pd.DataFrame(columns=["MD", "Value", "Type"])
+    points = pd.concat(tables, ignore_index=True)
+    points["MD"] = pd.to_numeric(points["MD"], errors="coerce")
+    points["Value"] = pd.to_numeric(points["Value"], errors="coerce")
+    points = points[points["Type"].isin(CONSTRAINT_CURVES.keys())]
+    return points.dropna().reset_index(drop=True)
+
+def misfit(result, points):
+    """
+    Root mean square of the relative differences between the model and the calibration points.
+
+    Parameters:
+        result (DataFrame): The first plotPPzhang output, with an MD column.
+        points (DataFrame): Output of calibration_points().
+
+    Returns:
+        float: The misfit, or nan if no point falls on the model curves.
+    """
+    if result is None:
+        return np.nan
+    md = result["MD"].to_numpy(dtype=float)
+    residuals = []
+    for constraint, group in points.groupby("Type"):
+        curve = result[CONSTRAINT_CURVES[constraint]].to_numpy(dtype=float)
+        model = np.interp(group["MD"].to_numpy(dtype=float), md, curve, left=np.nan, right=np.nan)
+        observed = group["Value"].to_numpy(dtype=float)
+        residuals.append((model - observed) / observed)
+    residuals = np.concatenate(residuals) if residuals else np.array([])
+    residuals = residuals[np.isfinite(residuals)]
+    if residuals.size == 0:
+        return np.nan
+    return float(np.sqrt(np.mean(residuals ** 2)))
+
+def evaluate(well, parameters, mwvalues, attrib, aliasdict, points, forms=None, flags=None, lithos=None):
+    """
+    Run the model for one parameter set and return only its misfit, so workers send back a float.
+
+    Parameters:
+        well (Well): The deviated Welly Well object.
+        parameters (dict): Output of geomech_parameters().
+        mwvalues, attrib, aliasdict, forms, flags, lithos: Passed through to plotPPzhang.
+        points (DataFrame): Output of calibration_points().
+
+    Returns:
+        float: misfit() of the run.
+    """
+    result = run_geomech(well, parameters, mwvalues, attrib, aliasdict, forms=forms, flags=flags, lithos=lithos)
+    return misfit(result[0], points)
+
+def sweep_grid(ranges):
+    """
+    Every combination of evenly spaced values of the swept parameters.
+
+    Parameters:
+        ranges (dict): Parameter name to (low, high, count).
+
+    Returns:
+        list: One dict of parameter values per grid point.
+    """
+    axes = {name: np.unique(np.linspace(low, high, max(int(count), 1))).tolist() for name, (low, high, count) in ranges.items()}
+    return [dict(zip(axes.keys(), values)) for values in itertools.product(*axes.values())]
+
+# Misfit given to failed runs, so the optimizer steers away from them
+FAILED_MISFIT = 1e6
+
+def optimize(submit, bounds, progress, stop, x0=None, maxiter=20, popsize=5, tol=0.01, patience=5, max_seconds=None, release=None):
+    """
+    Fit parameters to the calibration points by differential evolution, evaluating each generation as one batch.
+
+    The search stops when the population converges (tol), after maxiter generations, after
+    patience generations without a better fit, once max_seconds have passed, or when stop is set.
+
+    Parameters:
+        submit (callable): Takes a list of parameter dicts and returns one misfit future per dict.
+        bounds (dict): Parameter name to (low, high).
+        progress (dict): Updated in place with iterations, evaluations, best, misfit and elapsed.
+        stop (Event): Set to abandon the search; pending evaluations are handed to release.
+        x0 (dict): Starting parameter values, placed in the first generation.
+        maxiter, popsize, tol: Passed to differential_evolution.
+        patience (int): Generations without improvement before stopping.
+        max_seconds (float): Wall time budget, or None.
+        release (callable): Takes the futures of evaluations the search stopped waiting for.
+            None cancels them, which is only right if no one else waits on the same futures.
+
+    Returns:
+        dict: progress, with best holding the fitted parameters.
+    """
+    names = list(bounds)
+    started = time.time()
+    progress.update(iterations=0, evaluations=0, best=None, misfit=np.inf, elapsed=0.0)
+    generations = {"misfit": np.inf, "stale": 0}
+
+    def objective(x):
+        parameter_sets = [dict(zip(names, map(float, column))) for column in x.T]
+        futures = submit(parameter_sets)
+        pending = set(futures)
+        while pending and not stop.is_set():
+            pending = wait(pending, timeout=0.5).not_done
+        if pending:
+            if release is None:
+                for future in pending:
+                    future.cancel()
+            else:
+                # Once per submission, the same parameters can come up twice in a generation
+                release([future for future in futures if future in pending])
+        values = np.array([
+            future.result() if future.done() and not future.cancelled() and future.exception() is None else np.nan
+            for future in futures
+        ], dtype=float)
+        values[~np.isfinite(values)] = FAILED_MISFIT
+        progress["evaluations"] += len(futures) - len(pending)
+        progress["elapsed"] = time.time() - started
+        best = int(np.argmin(values))
+        if values[best] < progress["misfit"]:
+            progress.update(best=parameter_sets[best], misfit=float(values[best]))
+        return values
+
+    def callback(intermediate_result):
+        progress["iterations"] += 1
+        progress["elapsed"] = time.time() - started
+        if progress["misfit"] < generations["misfit"]:
+            generations.update(misfit=progress["misfit"], stale=0)
+        else:
+            generations["stale"] += 1
+        return stop.is_set() or generations["stale"] >= patience or (max_seconds is not None and progress["elapsed"] > max_seconds)
+
+    from scipy.optimize import differential_evolution
+    if x0 is not None:
+        x0 = np.clip([x0[name] for name in names], *np.transpose(list(bounds.values())))
+    differential_evolution(objective, list(bounds.values()), maxiter=maxiter, popsize=popsize, tol=tol,
+                           callback=callback, polish=False, x0=x0, updating="deferred", vectorized=True)
+    progress["elapsed"] = time.time() - started
+    return progress
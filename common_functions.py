@@ -6,19 +6,105 @@ See the GNU Affero General Public License for more details: <https://www.gnu.org
 """
 
 import streamlit as st
-from plotly.subplots import make_subplots
-import plotly.graph_objects as go
 import pandas as pd
 import numpy as np
-import pint
-from welly import Well
 import json
+import hashlib
+import copy
+import os
+import time
+import uuid
+import threading
+import multiprocessing
+import io
+import sys
+import pickle
+import tempfile
+import re
+import weakref
+from collections import OrderedDict
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+from geomech import GEOMECH_DEFAULTS, geomech_parameters, well_fingerprint, run_geomech, run_key, run_inputs, las_chunks
+from calibration import calibration_points, evaluate, sweep_grid, optimize
 
-def create_well_log_plot(curves, track_curves, track_curve_ranges, curve_properties, track_grids, sparse_points=None, sparse_point_properties=None, vert_height=1000, header_height=150, indexkey='DEPT', style='hv',halftrack=0,depthtext='DEPTH<br>metres<br>MD<br>KB',gap=15):
+def envelope_indices(values, nbins):
+    """
+    Pick the samples to draw so a curve keeps its shape at nbins rows of resolution.
+
+    The samples are split into nbins equal chunks and the minimum and maximum of
+    each chunk are kept, so spikes stay visible. Chunks containing nulls also keep
+    one null sample, so gaps in the log stay gaps.
+
+    Parameters:
+        values (ndarray): The curve values.
+        nbins (int): Number of chunks, normally the pixel rows of the plot.
+
+    Returns:
+        ndarray: Sorted indices into values.
+    """
+    n = len(values)
+    if nbins <= 0 or n <= 2 * nbins:
+        return np.arange(n)
+    chunk = -(-n // nbins)
+    nchunks = -(-n // chunk)
+    padded = np.full(nchunks * chunk, np.nan)
+    padded[:n] = values
+    padded = padded.reshape(nchunks, chunk)
+    nulls = np.isnan(padded)
+    starts = np.arange(nchunks) * chunk
+    lows = starts + np.where(nulls, np.inf, padded).argmin(axis=1)
+    highs = starts + np.where(nulls, -np.inf, padded).argmax(axis=1)
+    gaps = starts[nulls.any(axis=1)] + nulls[nulls.any(axis=1)].argmax(axis=1)
+    indices = np.unique(np.concatenate([lows, highs, gaps]))
+    return indices[indices < n]
+
+def wrap_segments(x, y):
+    """
+    Get the parts of a normalized curve that leave the track, shifted back into it.
+
+    Samples right of the track (x > 1) are drawn at x - 1 and samples left of it
+    (x < 0) at x + 1, each run together with its in-range neighbours so the line
+    enters from the track edge. Runs are separated by NaN so they draw as one trace.
+
+    Parameters:
+        x (ndarray): Normalized curve values, the track spans 0 to 1.
+        y (ndarray): Depths of the samples.
+
+    Returns:
+        tuple: (x, y) arrays of the wrapped segments, empty if the curve stays in range.
+    """
+    wrapped_x = []
+    wrapped_y = []
+    with np.errstate(invalid='ignore'):
+        sides = ((x > 1, -1), (x < 0, 1))
+    for outside, shift in sides:
+        if not outside.any():
+            continue
+        keep = outside.copy()
+        keep[1:] |= outside[:-1]
+        keep[:-1] |= outside[1:]
+        kept = np.flatnonzero(keep)
+        breaks = np.flatnonzero(np.diff(kept) > 1) + 1
+        wrapped_x.append(np.insert(x[kept] + shift, breaks, np.nan))
+        wrapped_y.append(np.insert(y[kept], breaks, np.nan))
+    if len(wrapped_x) == 2:
+        wrapped_x.insert(1, [np.nan])
+        wrapped_y.insert(1, [np.nan])
+    if not wrapped_x:
+        return np.array([]), np.array([])
+    return np.concatenate(wrapped_x), np.concatenate(wrapped_y)
+
+def create_well_log_plot(curves, track_curves, track_curve_ranges, curve_properties, track_grids, sparse_points=None, sparse_point_properties=None, vert_height=1000, header_height=150, indexkey='DEPT', style='hv',halftrack=0,depthtext='DEPTH<br>metres<br>MD<br>KB',gap=15,decimate=True,depth_range=None):
     """
     Create a well log plot with multiple tracks sharing an inverted depth axis.
     Supports individual scaling, styling, and logarithmic transformation for each curve.
+    With decimate, each curve is reduced to a min/max envelope of about two points per
+    pixel row, computed over depth_range (min, max) if given so zooming in refines it.
     """
+    from plotly.subplots import make_subplots
+    import plotly.graph_objects as go
     standardheight = 1000
     num_tracks = len(track_curves)
     annotation_height = header_height/vert_height#0.15
@@ -27,9 +113,18 @@ def create_well_log_plot(curves, track_curves, track_curve_ranges, curve_propert
     maxcurvenum = max(len(track_curve_names) + 1 for track_curve_names in track_curves)
    
     try:
-        yindex = curves[indexkey]
+        yindex = curves[indexkey].values
     except:
         yindex = curves.index.values
+
+    # Samples inside the depth window, with one neighbour either side so lines reach the edges
+    window = np.arange(len(yindex))
+    if depth_range is not None:
+        inside = np.flatnonzero((yindex >= min(depth_range)) & (yindex <= max(depth_range)))
+        if len(inside) > 0:
+            window = np.arange(max(inside[0] - 1, 0), min(inside[-1] + 2, len(yindex)))
+    nbins = int(vert_height * (1 - header_height/vert_height)) if decimate else 0
+    depth_extent = [np.nanmin(yindex[window]), np.nanmax(yindex[window])] if decimate else yindex
     widths = [1, halftrack] + [1] * (num_tracks-1)
     # Create figure
     fig = make_subplots(
@@ -43,8 +138,8 @@ def create_well_log_plot(curves, track_curves, track_curve_ranges, curve_propert
     )
     fig.add_trace(
                     go.Scattergl(
-                        x=np.zeros(len(yindex)),
-                        y=yindex,
+                        x=np.zeros(len(depth_extent)),
+                        y=depth_extent,
                         name='DEPT',
                         line=dict(
                             color='rgb(0,0,0,0)',
@@ -79,27 +174,31 @@ def create_well_log_plot(curves, track_curves, track_curve_ranges, curve_propert
                 # Get curve data and apply logarithmic transformation if needed
                 curve_data = curves[curve_name].copy()
                 if is_log:
-                    min_positive = curve_data[curve_data > 0].min() if any(curve_data > 0) else 1e-10
+                    min_positive = curve_data[curve_data > 0].min() if (curve_data > 0).any() else 1e-10
                     curve_data = np.log10(np.maximum(curve_data, min_positive))
                     left_val = np.log10(left_val)
                     right_val = np.log10(right_val)
                 
                 # Normalize the curve data
                 scale = 1.0 / (right_val - left_val)
-                normalized_data = (curve_data - left_val) * scale
+                normalized_data = (curve_data.values - left_val) * scale
+
+                # Keep only the samples the screen can show
+                shown = window[envelope_indices(normalized_data[window], nbins)]
+                normalized_data = normalized_data[shown]
+                curve_depths = yindex[shown]
                 
-                # Create custom hover text with original values
-                original_values = curves[curve_name]
-                hover_text = [f"{curve_name}: {val:.4g}" for val in original_values]
+                # Original values for the hover, formatted on the client
+                original_values = curves[curve_name].values[shown]
                 
                 # Plot the normalized curve with custom hover text
                 fig.add_trace(
                     go.Scattergl(
                         x=normalized_data,
-                        y=yindex,
+                        y=curve_depths,
                         name=curve_name,
-                        text=hover_text,
-                        hoverinfo='text+y',
+                        customdata=original_values,
+                        hovertemplate=f"{curve_name}: %{{customdata:.4g}}<br>%{{y}}<extra></extra>",
                         line=dict(
                             color=color,
                             dash=line_style,
@@ -113,44 +212,27 @@ def create_well_log_plot(curves, track_curves, track_curve_ranges, curve_propert
                 )
                 
                 # Wrap Curves
-                # Plot the original curve data as a two ghost curves
-                fig.add_trace(
-                    go.Scattergl(
-                        x=normalized_data-1,
-                        y=yindex,
-                        name=f"Ghost {curve_name}",
-                        line=dict(
-                            color=color,
-                            dash=line_style,
-                            width=thickness
+                # Plot the out of range parts of the curve wrapped into the track as one ghost curve
+                wrapped_x, wrapped_y = wrap_segments(normalized_data, curve_depths)
+                if len(wrapped_x) > 0:
+                    fig.add_trace(
+                        go.Scattergl(
+                            x=wrapped_x,
+                            y=wrapped_y,
+                            name=f"Ghost {curve_name}",
+                            line=dict(
+                                color=color,
+                                dash=line_style,
+                                width=thickness
+                            ),
+                            line_shape=style,
+                            opacity=0.3,  # Ghost curve transparency
+                            hoverinfo='skip',  # Do not show hover text for ghost curve
+                            showlegend=False
                         ),
-                        line_shape=style,
-                        opacity=0.3,  # Ghost curve transparency
-                        hoverinfo='skip',  # Do not show hover text for ghost curve
-                        showlegend=False
-                    ),
-                    row=2,
-                    col=(track_idx + 2) if track_idx>0 else track_idx+1
-                )
-                
-                fig.add_trace(
-                    go.Scattergl(
-                        x=normalized_data+1,
-                        y=yindex,
-                        name=f"Ghost {curve_name}",
-                        line=dict(
-                            color=color,
-                            dash=line_style,
-                            width=thickness
-                        ),
-                        line_shape=style,
-                        opacity=0.3,  # Ghost curve transparency
-                        hoverinfo='skip',  # Do not show hover text for ghost curve
-                        showlegend=False
-                    ),
-                    row=2,
-                    col=(track_idx + 2) if track_idx>0 else track_idx+1
-                )
+                        row=2,
+                        col=(track_idx + 2) if track_idx>0 else track_idx+1
+                    )
                 
                 # Add annotation elements
                 annotation_y = 1 - (curve_idx + 1) * annotation_spacing
@@ -232,8 +314,8 @@ def create_well_log_plot(curves, track_curves, track_curve_ranges, curve_propert
                     type="line",
                     x0=norm_grid_val,
                     x1=norm_grid_val,
-                    y0=yindex.min(),
-                    y1=yindex.max(),
+                    y0=np.nanmin(yindex),
+                    y1=np.nanmax(yindex),
                     line=dict(
                         color='rgba(128, 128, 128, 0.25)',
                         dash='solid',
@@ -248,19 +330,19 @@ def create_well_log_plot(curves, track_curves, track_curve_ranges, curve_propert
         Normalize a sparse point value based on the curve's range and logarithmic settings.
         
         Args:
-            point_value (float): The value to normalize
+            point_value (float or ndarray): The value(s) to normalize
             curve_range (dict): Dictionary containing 'left' and 'right' keys for normalization
             is_log (bool, optional): Whether to apply logarithmic transformation. Defaults to False.
         
         Returns:
-            float: Normalized value between 0 and 1
+            float or ndarray: Normalized value between 0 and 1
         """
         left_val = curve_range['left']
         right_val = curve_range['right']
         
         # Apply log transformation if needed
         if is_log:
-            point_value = np.log10(max(point_value, 1e-10))
+            point_value = np.log10(np.maximum(point_value, 1e-10))
             left_val = np.log10(max(left_val, 1e-10))
             right_val = np.log10(max(right_val, 1e-10))
         
@@ -286,33 +368,23 @@ def create_well_log_plot(curves, track_curves, track_curve_ranges, curve_propert
                 size = point_props.get('size', 10)
                 symbol = point_props.get('symbol', 'circle')
 
-                # Normalize points
-                normalized_points = []
-                original_points = []
-                for point in points:
-                    # Unpack x and y values
-                    x_val, y_val = point
-                    
-                    # Normalize x value
-                    norm_x_val = normalize_sparse_point(x_val, first_range, is_log)
-                    
-                    normalized_points.append((norm_x_val, y_val))
-                    original_points.append(point)
+                # Normalize the x values, the (x, depth) pairs go to the hover as is
+                original_points = np.array(points, dtype=float).reshape(-1, 2)
+                normalized_x = normalize_sparse_point(original_points[:, 0], first_range, is_log)
 
                 # Plot normalized points
                 fig.add_trace(
                     go.Scattergl(
-                        x=[point[0] for point in normalized_points],
-                        y=[point[1] for point in normalized_points],
+                        x=normalized_x,
+                        y=original_points[:, 1],
                         mode='markers',
                         marker=dict(
                             color=color,
                             size=size,
                             symbol=symbol
                         ),
-                        text=[f"{group_key}: {orig[0]:.4g}, Depth: {orig[1]:.4g}" 
-                              for orig, point in zip(original_points, normalized_points)],
-                        hoverinfo='text',
+                        customdata=original_points,
+                        hovertemplate=f"{group_key}: %{{customdata[0]:.4g}}, Depth: %{{customdata[1]:.4g}}<extra></extra>",
                         showlegend=False
                     ),
                     row=2,
@@ -487,10 +559,55 @@ def create_well_log_plot(curves, track_curves, track_curve_ranges, curve_propert
 
 
 
+# Figures are cached by a version stamp of the curve data, the DataFrame itself is not hashed.
+# Everything else that shapes the figure is hashed by streamlit as part of the key.
+@st.cache_data(max_entries=16, show_spinner=False)
+def cached_well_log_plot(data_version, _curves, track_curves, track_curve_ranges, curve_properties, track_grids, sparse_points=None, sparse_point_properties=None, vert_height=1000, header_height=150, indexkey='DEPT', style='hv',halftrack=0,depthtext='DEPTH<br>metres<br>MD<br>KB',gap=15,decimate=True,depth_range=None):
+    """
+    Memoized create_well_log_plot, keyed by data_version and the plot configuration.
+
+    data_version must change whenever the content of _curves changes. _curves may be a
+    DataFrame or the output of compact_frame(), which is only expanded on a cache miss.
+    """
+    return create_well_log_plot(expand_frame(_curves), track_curves, track_curve_ranges, curve_properties, track_grids, sparse_points, sparse_point_properties, vert_height, header_height, indexkey, style, halftrack, depthtext, gap, decimate, depth_range)
+
+def interp_curves(x, y, basis, undefined=np.nan):
+    """
+    Linearly interpolate every row of a 2-D array onto a new basis in one pass.
+
+    Mirrors scipy's interp1d(kind='linear', bounds_error=False), which is what
+    welly's Curve.to_basis uses, so NaN gaps spread to the neighbouring
+    samples exactly as before.
+
+    Parameters:
+        x (ndarray): The original basis, shape (n,).
+        y (ndarray): The curve values, shape (m, n), one row per curve.
+        basis (ndarray): The new basis to compute values for.
+        undefined (float): The value to use outside the original basis.
+
+    Returns:
+        ndarray: The interpolated values, shape (m, len(basis)).
+    """
+    if np.any(x[1:] < x[:-1]):
+        order = np.argsort(x, kind="mergesort")
+        x = x[order]
+        y = np.take(y, order, axis=1)
+    hi = np.clip(np.searchsorted(x, basis), 1, len(x) - 1)
+    lo = hi - 1
+    y_lo = np.take(y, lo, axis=1)
+    values = (np.take(y, hi, axis=1) - y_lo) / (x[hi] - x[lo])
+    values *= basis - x[lo]
+    values += y_lo
+    values[:, (basis < x[0]) | (basis > x[-1])] = undefined
+    return values
+
 def resample_well(string_las = None, well=None, step=5):
     """
     Resample all curves in a Welly Well object to a common depth basis.
 
+    The target basis is built once and every numeric curve sharing a depth
+    index is interpolated together; other curves fall back to Curve.to_basis.
+
     Parameters:
         well (Well): A Welly Well object containing curves to be resampled.
         step (float): The step size for the resampled depth basis (default is 5).
@@ -499,6 +616,7 @@ def resample_well(string_las = None, well=None, step=5):
         Well: The modified Well object with all curves resampled in-place.
     """
     if well is None:
+        from welly import Well
         well = Well.from_las(string_las, index = "m")
     
     if step==0 or step is None:
@@ -506,84 +624,402 @@ def resample_well(string_las = None, well=None, step=5):
     # Determine the maximum depth from all curves
     max_depth = max(curve.basis[-1] for curve in well.data.values() if hasattr(curve, 'basis'))
     
+    # Same basis as curve.to_basis(start=0, stop=max_depth, step=step)
+    stop = (max_depth // step) * step
+    basis = np.linspace(0, stop, int(np.round(stop / step, 0)) + 1)
 
-    # Resample each curve to the new depth basis
+    # Group the numeric curves by their depth index
+    groups = []
     for curve_name, curve in well.data.items():
-        #if hasattr(curve, 'to_basis'):  # Ensure the curve has the to_basis method
+        if curve.df.shape[1] == 1 and pd.api.types.is_numeric_dtype(curve.df.iloc[:, 0]):
+            index = curve.df.index.values
+            for group_index, curve_names in groups:
+                if np.array_equal(group_index, index):
+                    curve_names.append(curve_name)
+                    break
+            else:
+                groups.append((index, [curve_name]))
+        else:
+            well.data[curve_name] = curve.to_basis(start=0,stop=max_depth,
+                    step=step, undefined=np.nan, interp_kind='linear'
+                )
 
-        well.data[curve_name] = curve.to_basis(start=0,stop=max_depth,
-                step=step, undefined=np.nan, interp_kind='linear'
-            )
+    # Resample each group of curves to the new depth basis
+    for index, curve_names in groups:
+        curves = [well.data[curve_name] for curve_name in curve_names]
+        values = interp_curves(
+            index.astype(float),
+            np.array([curve.df.values[:, 0] for curve in curves], dtype=float),
+            basis
+        )
+        for curve_name, curve, curve_values in zip(curve_names, curves, values):
+            new_curve = copy.copy(curve)
+            new_curve.df = pd.DataFrame(curve_values, index=basis, columns=curve.df.columns)
+            new_curve.df.index.name = curve.df.index.name
+            well.data[curve_name] = new_curve
     
     return well
 
+# Curve tables shown in each session are held as float32 column arrays when STRESSAPP_COMPACT_CURVES=1.
+# Model outputs and depth curves always stay float64, so exports keep their full precision.
+COMPACT_CURVES = os.environ.get("STRESSAPP_COMPACT_CURVES", "0") != "0"
+DEPTH_CURVES = ["DEPT", "MD", "TVDM"]
+
+def compact_frame(df, base=None, float32=None):
+    """
+    Pack a DataFrame of curves into column arrays for keeping in session state.
+
+    Columns identical to a curve of base, the Well the frame was computed from, are
+    kept as references to that curve instead of copies. The index is kept as is.
+
+    Parameters:
+        df (DataFrame): The curves, or None.
+        base (Well): The input well of a model run, or None.
+        float32 (bool): Store float columns other than the DEPTH_CURVES as float32,
+            COMPACT_CURVES if None.
+
+    Returns:
+        dict: The packed frame, or None if df is None.
+    """
+    if df is None:
+        return df
+    if float32 is None:
+        float32 = COMPACT_CURVES
+    arrays, shared = {}, []
+    for name in df.columns:
+        values = df[name].to_numpy()
+        if base is not None and name in base.data and np.array_equal(base.data[name].values, values, equal_nan=True):
+            shared.append(name)
+        elif float32 and values.dtype.kind == "f" and name not in DEPTH_CURVES:
+            arrays[name] = values.astype(np.float32)
+        else:
+            # A column of a DataFrame is a view of a 2-D block holding its neighbours too,
+            # copying it lets the frame, and the columns shared with base, be freed
+            arrays[name] = np.array(values, copy=True)
+    return {"index": df.index, "columns": list(df.columns), "arrays": arrays, "shared": shared, "base": base}
+
+def expand_frame(store):
+    """
+    Turn the output of compact_frame() back into a float64 DataFrame.
+
+    float32 values are rounded to the 7 significant digits they hold, so exports
+    show 1.234568 rather than 1.2345677614212036. A DataFrame or None is returned as is.
+
+    Parameters:
+        store (dict): Output of compact_frame().
+
+    Returns:
+        DataFrame: The curves.
+    """
+    if not isinstance(store, dict):
+        return store
+    columns = {}
+    for name in store["columns"]:
+        if name in store["shared"]:
+            columns[name] = store["base"].data[name].values
+            continue
+        values = store["arrays"][name]
+        if values.dtype == np.float32:
+            values = values.astype(np.float64)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                scale = 10.0 ** (6 - np.floor(np.log10(np.abs(values))))
+                rounded = np.rint(values * scale) / scale
+            values = np.where(np.isfinite(rounded), rounded, values)
+        columns[name] = values
+    return pd.DataFrame(columns, index=store["index"])
+
+def frame_axes(frame):
+    """
+    The index and column names of a DataFrame or of compact_frame() output, without expanding it.
+
+    Returns:
+        tuple: (Index, list of column names).
+    """
+    if isinstance(frame, dict):
+        return frame["index"], frame["columns"]
+    return frame.index, list(frame.columns)
+
+# Export files are built once per output version, and only when a download button asks for them.
+# The output itself is passed unhashed (leading underscore), the version is the cache key.
+@st.cache_data(max_entries=4, show_spinner=False)
+def export_csv(version, _output):
+    """
+    The model output as CSV bytes.
+
+    Parameters:
+        version (str): outputversion of _output.
+        _output: outputdata[0], a DataFrame or compact_frame() output.
+
+    Returns:
+        bytes: The CSV file.
+    """
+    return expand_frame(_output).to_csv().encode("utf-8")
+
+# Rows in an Excel sheet, the header included
+EXCEL_MAX_ROWS = 1048576
+# Rows written at a time by export_excel()
+EXCEL_BLOCK_ROWS = 5000
+# Seconds export_excel() took to build the workbook of each output version. Written by the
+# download request that builds it, read by page runs, so always under excel_seconds_lock.
+excel_seconds = {}
+excel_seconds_lock = threading.Lock()
+
+def excel_sheets(rows):
+    """
+    Split the rows of an Excel export over sheets of at most EXCEL_MAX_ROWS rows with the header.
+
+    Parameters:
+        rows (int): Number of data rows.
+
+    Returns:
+        list: (start, stop) of the rows on each sheet.
+    """
+    per_sheet = EXCEL_MAX_ROWS - 1
+    return [(start, min(start + per_sheet, rows)) for start in range(0, max(rows, 1), per_sheet)]
+
+@st.cache_data(max_entries=4, show_spinner=False)
+def export_excel(version, _output):
+    """
+    The model output as an Excel workbook, see export_csv().
+
+    The workbook is written in openpyxl's write-only mode a block of rows at a time, so only
+    the rows being written are held as cells, and is split over Sheet1, Sheet2, ... when
+    there are more rows than one sheet holds (see excel_sheets()).
+
+    Returns:
+        bytes: The xlsx file.
+    """
+    from openpyxl import Workbook
+    started = time.time()
+    frame = expand_frame(_output)
+    workbook = Workbook(write_only=True)
+    for number, (start, stop) in enumerate(excel_sheets(len(frame)), start=1):
+        sheet = workbook.create_sheet(f"Sheet{number}")
+        sheet.append([str(name) for name in frame.columns])
+        for block_start in range(start, stop, EXCEL_BLOCK_ROWS):
+            block = frame.iloc[block_start:min(block_start + EXCEL_BLOCK_ROWS, stop)].to_numpy(dtype=object)
+            block[pd.isna(block)] = None
+            for row in block.tolist():
+                sheet.append(row)
+    buffer = io.BytesIO()
+    workbook.save(buffer)
+    # Only a cache miss gets here, so this is the time of an actual build
+    with excel_seconds_lock:
+        excel_seconds[version] = time.time() - started
+        while len(excel_seconds) > 16:
+            excel_seconds.pop(next(iter(excel_seconds)))
+    return buffer.getvalue()
+
+def excel_note(version, output):
+    """
+    Caption for the Excel download: the sheets the rows are split over, and how long the
+    workbook took to build once it has been downloaded (shown from the next page run on).
+
+    Parameters:
+        version (str): outputversion of output.
+        output: outputdata[0], a DataFrame or compact_frame() output.
+
+    Returns:
+        str: The caption, empty if there is nothing to report.
+    """
+    notes = []
+    sheets = len(excel_sheets(len(frame_axes(output)[0])))
+    if sheets > 1:
+        notes.append(f"Split over {sheets} sheets of up to {EXCEL_MAX_ROWS - 1} rows")
+    with excel_seconds_lock:
+        seconds = excel_seconds.get(version)
+    if seconds is not None:
+        notes.append(f"Built in {seconds:.1f} s")
+    return ", ".join(notes)
+
+# Parquet exports carry the LAS header in their metadata, so the import page can open them
+# like the LAS they were written from, without the ~A section to parse.
+PARQUET_HEADER_KEY = b"stressapp.las_header"
+
+@st.cache_data(max_entries=4, show_spinner=False)
+def export_parquet(version, _output, _header):
+    """
+    The model output as a zstd compressed Parquet file, see export_csv().
+
+    Curves and depths are written as float64, so load_well() reads back the exact values.
+
+    Parameters:
+        _header (str): outputdata[1], the LAS header from run_geomech().
+
+    Returns:
+        bytes: The Parquet file.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    frame = expand_frame(_output)
+    table = pa.Table.from_pandas(frame, preserve_index=False)
+    table = table.replace_schema_metadata({**(table.schema.metadata or {}), PARQUET_HEADER_KEY: _header.encode("utf-8")})
+    buffer = io.BytesIO()
+    pq.write_table(table, buffer, compression="zstd")
+    return buffer.getvalue()
+
+def export_las(_output, header):
+    """
+    The model output as a LAS file, written block by block from the float64 output table,
+    with the same digits as the LAS plotPPzhang writes.
+
+    Not cached, so the LAS text only exists while it is being downloaded.
+
+    Parameters:
+        _output: outputdata[0], a DataFrame or compact_frame() output.
+        header (str): outputdata[1], the LAS header from run_geomech().
+
+    Returns:
+        BytesIO: The LAS file.
+    """
+    buffer = io.BytesIO()
+    for chunk in las_chunks(header, expand_frame(_output)):
+        buffer.write(chunk.encode("utf-8"))
+    buffer.seek(0)
+    return buffer
+
+def read_las_string(las_file):
+    """
+    Get the text of an uploaded LAS file together with a digest of its content.
+
+    Parameters:
+        las_file: The uploaded file (or StringIO of a generated LAS) from session state.
+
+    Returns:
+        tuple: (digest, string_data), where digest is the sha1 hex of the raw content.
+            string_data is left as bytes for a Parquet export, see load_well().
+    """
+    raw = las_file.getvalue()
+    if isinstance(raw, bytes) and raw[:4] == b"PAR1":
+        return hashlib.sha1(raw).hexdigest(), raw
+    if isinstance(raw, bytes):
+        return hashlib.sha1(raw).hexdigest(), raw.decode('utf-8', errors='replace')
+    return hashlib.sha1(raw.encode('utf-8', errors='replace')).hexdigest(), raw
+
+def parse_las(content):
+    """
+    Parse LAS text, or a Parquet export of the model output, with lasio.
+
+    Parameters:
+        content (str or bytes): LAS text, or the bytes of a file from export_parquet().
+
+    Returns:
+        LASFile: The lasio LASFile object.
+    """
+    import lasio
+    if not isinstance(content, bytes):
+        return lasio.read(content)
+    import pyarrow.parquet as pq
+    table = pq.read_table(io.BytesIO(content))
+    header = (table.schema.metadata or {}).get(PARQUET_HEADER_KEY)
+    if header is None:
+        raise ValueError("The Parquet file has no LAS header, only exports of this app can be imported")
+    las = lasio.read(header.decode("utf-8"), ignore_data=True)
+    las.set_data(table.to_pandas().to_numpy(dtype=float))
+    return las
+
+def load_well(content, index=None):
+    """
+    Build a Welly Well from LAS text, or from a Parquet export of the model output.
+
+    Parameters:
+        content (str or bytes): LAS text, or the bytes of a file from export_parquet().
+        index (str): Passed to welly.
+
+    Returns:
+        Well: The Welly Well object.
+    """
+    from welly import Well
+    return Well.from_lasio(parse_las(content), index=index)
+
+# The content of a file is parsed once per digest, for both read_las() and read_deviated_well().
+# welly copies the data into its own curves, so the shared LASFile is never modified.
+@st.cache_resource(max_entries=8, show_spinner=False)
+def parsed_las(digest, _string_las):
+    """
+    parse_las() once per content digest.
+    """
+    return parse_las(_string_las)
+
+# Parsed wells are cached by content digest, so reruns with the same file skip parsing.
+# The text itself is passed unhashed (leading underscore), the digest is the cache key.
+@st.cache_data(max_entries=8, show_spinner=False)
+def read_las(digest, _string_las):
+    """
+    Build the well of a LAS string once per content digest.
+
+    Returns:
+        tuple: (Well, DataFrame) the parsed well and its df().
+    """
+    from welly import Well
+    well = Well.from_lasio(parsed_las(digest, _string_las))
+    return well, compact_frame(well.df())
+
+# The deviated well is the model input and stays float64. It is shared by every session
+# working on the same file and settings, so it must not be modified after it is returned.
+@st.cache_resource(max_entries=8, show_spinner=False)
+def read_deviated_well(digest, _string_las, step, deva, neutron="None"):
+    """
+    Resample and deviate a LAS string once per content digest, step, deviation survey and neutron curve.
+
+    The LAS text is not parsed again, the Well is built from the LASFile read_las() parsed.
+
+    Returns:
+        Well: The resampled Well with MD and TVDM curves, and the neutron curve in v/v.
+    """
+    from welly import Well
+    well = Well.from_lasio(parsed_las(digest, _string_las), index="m")
+    wella = getwelldev(wella=resample_well(well=well, step=step), deva=deva, step=step)
+    if neutron != "None":
+        neutron_to_fraction(wella, neutron)
+    return wella
+
 #Function to get well deviation
 def getwelldev(string_las=None,wella=None,deva=None,step=None):
+    """
+    Add MD and TVDM curves to a well from a deviation survey (vertical if deva is None).
+
+    Depths above the first log sample are padded up to surface at the log spacing.
+
+    Parameters:
+        string_las (str): LAS text, used if wella is not given.
+        wella (Well): The Welly Well object.
+        deva (DataFrame): Deviation survey with MD, INC and AZIM columns, or None.
+        step (float): The sample interval to use, defaults to the log spacing.
+
+    Returns:
+        Well: The Well object with MD and TVDM curves on a unified basis.
+    """
     if wella is None:
+        from welly import Well
         wella = Well.from_las(string_las, index = "m")
-    depth_track = wella.df().index
+    depth_track = well_depth_index(wella)
+    start_depth = depth_track[0]
+    spacing = (depth_track[-1]-depth_track[0])/len(depth_track)
+    if step is not None:
+        spacing = step
+    #print("Sample interval is :",spacing)
+    padlength = int(start_depth/spacing)
+    padval = start_depth-(spacing*np.arange(padlength, 0, -1))
+    padval[:1] = 0
+    #print("pad depths: ",padval)
+    md = np.append(padval,depth_track)
     if deva is not None:
         #deva=pd.read_csv(devpath, sep=r'[ ,	]',skipinitialspace=True)
-        #print(deva)
-        start_depth = wella.df().index[0]
-        final_depth = wella.df().index[-1]
-        spacing = ((wella.df().index.values[-1]-wella.df().index.values[0])/len(wella.df().index.values))
-        if step is not None:
-            spacing = step
-        #print("Sample interval is :",spacing)
-        padlength = int(start_depth/spacing)
-        #print(padlength)
-        padval = np.zeros(padlength)
-        i = 1
-        while(i<padlength):
-            padval[-i] = start_depth-(spacing*i)
-            i+=1
-        #print("pad depths: ",padval)
-        md = depth_track
-        md =  np.append(padval,md)
         mda = pd.to_numeric(deva["MD"], errors='coerce')
         inca = pd.to_numeric(deva["INC"], errors='coerce')
         azma = pd.to_numeric(deva["AZIM"], errors='coerce')
         inc = np.interp(md,mda,inca)
         azm = np.interp(md,mda,azma)
-        #i = 1
-        #while md[i]<final_depth:
-        #    if md[i]
-        z = deva.to_numpy(na_value=0)
-        dz = [md,inc,azm]
     else:
-        start_depth = wella.df().index[0]
-        final_depth = wella.df().index[-1]
-        spacing = ((wella.df().index.values[-1]-wella.df().index.values[0])/len(wella.df().index.values))
-        if step is not None:
-            spacing = step
-        #print("Sample interval is :",spacing)
-        padlength = int(start_depth/spacing)
-        #print(padlength)
-        padval = np.zeros(padlength)
-        i = 1
-        while(i<padlength):
-            padval[-i] = start_depth-(spacing*i)
-            i+=1
-        #print("pad depths: ",padval)
-        
-        md = depth_track
-        md =  np.append(padval,md)
-        #md[0] = 0
-        #md[0:padlength-1] = padval[0:padlength-1]
-        inc = np.zeros(len(depth_track)+padlength)
-        azm = np.zeros(len(depth_track)+padlength)
-        dz = [md,inc,azm]
-
-
-
-    dz = np.transpose(dz)
-    dz = pd.DataFrame(dz)
-    dz = dz.dropna()
-    #print(dz)
-    finaldepth = dz.to_numpy()[-1][0]
-    #print("Final depth is ",finaldepth)
-    wella.location.add_deviation(dz, wella.location.td)
+        inc = np.zeros(len(md))
+        azm = np.zeros(len(md))
+
+    dz = np.column_stack([md,inc,azm])
+    dz = dz[~np.isnan(dz).any(axis=1)]
+    # Same as wella.location.add_deviation(dz, wella.location.td), cached per survey and basis
+    fingerprint = hashlib.sha1(dz.tobytes()).hexdigest()
+    wella.location.deviation, wella.location.position, wella.location.dogleg = survey_position(fingerprint, dz, wella.location.td)
     tvdg = wella.location.tvd
     md = wella.location.md
     from welly import curve
@@ -597,42 +1033,1068 @@ def getwelldev(string_las=None,wella=None,deva=None,step=None):
 
     return wella
 
+# Minimum curvature on long surveys is slow, so the position log is cached by a
+# fingerprint of the MD/INC/AZIM table, which also encodes the depth basis and step.
+@st.cache_data(max_entries=16, show_spinner=False)
+def survey_position(fingerprint, _dz, td):
+    """
+    Compute the deviation, position log and dogleg severity for a survey.
+
+    Parameters:
+        fingerprint (str): sha1 of the survey table, the cache key.
+        _dz (ndarray): The survey with rows like MD, INC, AZIM.
+        td (float): The TD of the well.
+
+    Returns:
+        tuple: (deviation, position, dogleg) as set by Location.add_deviation.
+    """
+    from welly.tools import compute_position_log
+    return compute_position_log(_dz, td, method='mc', azimuth_datum=0, course_length=30)
 
+def well_depth_index(wella):
+    """
+    Get the depth index that wella.df() would have, without building the DataFrame.
 
+    Parameters:
+        wella (Well): The Welly Well object.
 
-# Function to load aliases from JSON file
-def load_aliases():
+    Returns:
+        ndarray: The depth index.
+    """
+    basis = wella.survey_basis()
+    if basis is None:
+        # Let welly raise its usual error
+        return wella.df().index.values
+    # df() puts every curve through to_basis(basis), which rebuilds the basis with linspace
+    steps = np.round((basis[-1] - basis[0]) / (basis[1] - basis[0]), 0)
+    return np.linspace(basis[0], basis[-1], int(steps) + 1)
+
+@st.cache_data(max_entries=32, show_spinner=False)
+def geomech_inputs(mudattributedf, well_info, alias):
+    """
+    Build the run inputs from the well data page once per change to the mud table, well info or aliases.
+
+    Returns:
+        dict: mwvalues, attrib and aliasdict.
+    """
+    return run_inputs(mudattributedf, well_info, alias)
+
+GEOMECH_WORKERS = min(4, os.cpu_count() or 1)
+GEOMECH_RESULTS = 8
+CALIBRATION_RESULTS = 4096
+
+@st.cache_resource
+def geomech_pool(name="runs"):
+    """
+    Process pool shared by all sessions, one per name so calibration runs do not queue ahead of interactive ones.
+
+    Workers are started by a forkserver that preloads geomech_worker, rather than forked from
+    the multi-threaded server. Where forkserver is not available the runs go to a single
+    background thread instead.
+    """
+    if "forkserver" not in multiprocessing.get_all_start_methods():
+        return ThreadPoolExecutor(max_workers=1)
+    context = multiprocessing.get_context("forkserver")
+    context.set_forkserver_preload(["geomech_worker"])
+    return ProcessPoolExecutor(max_workers=GEOMECH_WORKERS, mp_context=context)
+
+def shared_pool(name):
+    """
+    geomech_pool(name), replaced by a new pool if a worker crash has broken it.
+
+    A ProcessPoolExecutor whose worker dies fails every pending job and refuses new ones,
+    so the broken pool is dropped from the cache rather than kept for the life of the server.
+    """
+    pool = geomech_pool(name)
+    if getattr(pool, "_broken", False):
+        pool.shutdown(wait=False, cancel_futures=True)
+        geomech_pool.clear(name)
+        pool = geomech_pool(name)
+    return pool
+
+@st.cache_resource
+def geomech_futures(name="runs"):
+    """
+    Futures of recent jobs on the named pool shared by all sessions, keyed by run_key(), oldest first,
+    with the number of submissions still holding each future (see release_to()).
+    """
+    return {"lock": threading.Lock(), "futures": OrderedDict(), "holders": {}}
+
+def submit_shared(name, limit, key, function, *args, **kwargs):
+    """
+    Queue function on the named pool, reusing a pending or successful job with the same key.
+
+    Parameters:
+        name (str): Pool name.
+        limit (int): Finished jobs to keep for reuse.
+        key (str): run_key() of the job inputs.
+        function: Module level function to run, with its *args and **kwargs.
+
+    Returns:
+        Future: The job's future.
+    """
+    return submit_to(shared_pool(name), geomech_futures(name), limit, key, function, *args, **kwargs)
+
+def submit_to(pool, jobs, limit, key, function, *args, **kwargs):
+    """
+    submit_shared() with the pool and job store already looked up, for use off the script thread.
+    """
+    with jobs["lock"]:
+        future = jobs["futures"].pop(key, None)
+        if future is None or future.cancelled() or (future.done() and future.exception() is not None):
+            jobs["holders"].pop(future, None)
+            future = pool.submit(function, *args, **kwargs)
+        jobs["futures"][key] = future
+        jobs["holders"][future] = jobs["holders"].get(future, 0) + 1
+        if len(jobs["futures"]) > limit:
+            # Forget the oldest finished jobs; pending ones stay until they finish
+            finished = [k for k, f in jobs["futures"].items() if f.done()]
+            for k in finished[:len(jobs["futures"]) - limit]:
+                jobs["holders"].pop(jobs["futures"].pop(k), None)
+    return future
+
+def release_to(jobs, futures):
+    """
+    Drop one hold on each of futures, taken by submit_to() for the same job store.
+
+    Jobs are shared by every session that submitted the same inputs, so a job is only
+    cancelled once no submission holds it, and only if it has not started.
+
+    Parameters:
+        jobs (dict): geomech_futures() of the pool the futures were submitted to.
+        futures (iterable): Futures from submit_to(), once for each time they were submitted.
+    """
+    with jobs["lock"]:
+        for future in futures:
+            holders = jobs["holders"].get(future, 0) - 1
+            if holders > 0:
+                jobs["holders"][future] = holders
+            else:
+                jobs["holders"].pop(future, None)
+                future.cancel()
+
+def submit_geomech(well_version, well, parameters, mwvalues, attrib, aliasdict, forms=None, flags=None, lithos=None, doi=0.0):
+    """
+    Queue a plotPPzhang run on the process pool, reusing a pending or finished run with the same inputs.
+
+    plotPPzhang is a single call, so only whole runs are reused: changing any parameter runs the
+    full model again. The well-only preparation is cached apart from this, by read_deviated_well().
+
+    Parameters:
+        well_version (str): well_fingerprint() of well.
+        well (Well): The deviated Welly Well object.
+        parameters (dict): Output of geomech_parameters().
+        mwvalues, attrib, aliasdict, forms, flags, lithos, doi: Passed through to plotPPzhang.
+
+    Returns:
+        dict: The job, with its key, future, submission time and well.
+    """
+    key = run_key(well_version, parameters, mwvalues, attrib, aliasdict, forms, flags, lithos, doi)
+    future = submit_shared("runs", GEOMECH_RESULTS, key, run_geomech, well, parameters, mwvalues, attrib, aliasdict,
+                           forms=forms, flags=flags, lithos=lithos, doi=doi)
+    return {"key": key, "future": future, "submitted": time.time(), "well": well}
+
+def start_geomech(job, doi_only=False):
+    """
+    Make job the session's current model run, releasing the one it supersedes (see release_to()).
+
+    Parameters:
+        job (dict): Output of submit_geomech().
+        doi_only (bool): Only the depth of interest changed, so only the point analysis images are taken from the run.
+    """
+    previous = st.session_state.get("geomech_job")
+    if previous is not None:
+        release_to(geomech_futures("runs"), [previous["future"]])
+    # The logs on screen are only current if the superseded run did not change them either
+    job["doi_only"] = doi_only and (previous is None or previous["doi_only"])
+    st.session_state.geomech_job = job
+
+def collect_geomech():
+    """
+    Move the results of the session's finished model run into outputdata.
+
+    A run that failed or was cancelled is reported with st.error, and the results on screen are kept.
+
+    Returns:
+        bool: True if a run was collected.
+    """
+    job = st.session_state.get("geomech_job")
+    if job is None or not job["future"].done():
+        return False
+    st.session_state.geomech_job = None
+    release_to(geomech_futures("runs"), [job["future"]])
+    if job["future"].cancelled():
+        st.error("The model run was cancelled, press Recalculate to run it again.")
+        return False
+    if job["future"].exception() is not None:
+        error = job["future"].exception()
+        st.error(f"The model run failed: {str(error) or type(error).__name__}")
+        return False
+    result = job["future"].result()
+    if job["doi_only"]:
+        # The logs do not depend on the depth of interest, keep the ones already plotted
+        st.session_state.outputdata[2:7] = result[2:7]
+    else:
+        st.session_state.outputdata[0:7] = [compact_frame(result[0], base=job["well"], float32=False), *result[1:7]]
+        st.session_state.outputversion = uuid.uuid4().hex
+    st.session_state.lastdoi = result[7]
+    return True
+
+@st.fragment(run_every=1)
+def geomech_progress():
+    """
+    Show how long the session's model run has been going, and rerun the page once it finishes.
+    """
+    job = st.session_state.get("geomech_job")
+    if job is None:
+        return
+    track_session()
+    if job["future"].done():
+        st.rerun()
+    st.info(f"Calculating stresses... {time.time() - job['submitted']:.0f} s", icon="⏳")
+
+def show_geomech_progress():
+    """
+    Poll the session's model run, if there is one; the results on screen stay up until it finishes.
+    """
+    if st.session_state.get("geomech_job") is not None:
+        geomech_progress()
+
+# Model parameters that can be swept; the algorithm choice and depth of interest are not continuous
+SWEEP_PARAMETERS = [key for key in GEOMECH_DEFAULTS if key not in ["program_option", "doi"]]
+
+def sweep_choices(key):
+    """
+    The SWEEP_PARAMETERS that change the model with the session's current settings, for a
+    sweep or an optimizer fit.
+
+    ul_exp is replaced by lamb while ul_depth is 0 (see geomech_parameters()), so it is only
+    offered once an unloading depth is set. Picks no longer on offer are dropped from the
+    multiselect's state under key.
+
+    Returns:
+        list: Parameter names.
+    """
+    choices = list(SWEEP_PARAMETERS)
+    if st.session_state.get("ul_depth", 0) == 0:
+        choices.remove("ul_exp")
+        st.caption("ul_exp has no effect while ul_depth is 0, set an unloading depth to vary it.")
+    if key in st.session_state:
+        st.session_state[key] = [name for name in st.session_state[key] if name in choices]
+    return choices
+
+def apply_parameters(parameters):
+    """
+    Button callback that sets model parameters on the Geomech page and recalculates.
+
+    Parameters:
+        parameters (dict): Parameter name to value.
+    """
+    for key, value in parameters.items():
+        st.session_state[key] = value
+        # Let the input widget pick up the new value
+        st.session_state.pop(f"{key}_input", None)
+    st.session_state.recalculate = True
+
+def parameter_ranges(prefix, names, count=True):
+    """
+    Inputs for the range of each parameter picked for a sweep or a fit, starting at its current value.
+
+    Parameters:
+        prefix (str): Widget key prefix.
+        names (list): Parameter names.
+        count (bool): Also ask for the number of values in the range.
+
+    Returns:
+        dict: Parameter name to (low, high), or (low, high, count).
+    """
+    ranges = {}
+    for name in names:
+        cols = st.columns(3 if count else 2)
+        low = cols[0].number_input(f"{name} from", value=float(st.session_state[name]), format="%g", key=f"{prefix}_{name}_low")
+        high = cols[1].number_input("to", value=float(st.session_state[name]), format="%g", key=f"{prefix}_{name}_high")
+        if count:
+            ranges[name] = (low, high, cols[2].number_input("values", min_value=1, value=5, key=f"{prefix}_{name}_count"))
+        else:
+            ranges[name] = (low, high)
+    return ranges
+
+def calibration_submitter(points):
+    """
+    Bind the session's well and run inputs into a function that queues misfit evaluations.
+
+    The returned function does not touch the session, so the optimizer thread can call it.
+
+    Parameters:
+        points (DataFrame): Output of calibration_points().
+
+    Returns:
+        callable: Takes a list of dicts of parameter values, on top of the current ones, and returns one future per dict.
+    """
+    well = st.session_state.wellobj
+    well_version = well_fingerprint(well)
+    inputs = geomech_inputs(st.session_state.mudattributedf, st.session_state.well_info, st.session_state.alias)
+    current = {key: st.session_state[key] for key in GEOMECH_DEFAULTS}
+    forms, flags, lithos = st.session_state.data_array[1], st.session_state.data_array[4], st.session_state.data_array[3]
+    pool, jobs = shared_pool("calibration"), geomech_futures("calibration")
+
+    def submit(parameter_sets):
+        futures = []
+        for parameters in parameter_sets:
+            model_parameters = geomech_parameters({**current, **parameters})
+            key = run_key(well_version, model_parameters, inputs["mwvalues"], inputs["attrib"], inputs["aliasdict"], forms, flags, lithos, points)
+            futures.append(submit_to(pool, jobs, CALIBRATION_RESULTS, key, evaluate, well, model_parameters, inputs["mwvalues"],
+                                     inputs["attrib"], inputs["aliasdict"], points, forms=forms, flags=flags, lithos=lithos))
+        return futures
+    return submit
+
+def future_misfit(future):
+    """
+    The misfit of a finished evaluation, nan if it failed or was cancelled.
+    """
+    if future.cancelled() or future.exception() is not None:
+        return np.nan
+    return future.result()
+
+@st.fragment(run_every=1)
+def sweep_progress():
+    """
+    Show how far the session's sweep has got, and rerun the page once it finishes.
+    """
+    sweep = st.session_state.get("sweep")
+    if sweep is None:
+        return
+    track_session()
+    done = sum(future.done() for future in sweep["futures"])
+    if done == len(sweep["futures"]):
+        st.rerun()
+    st.progress(done / len(sweep["futures"]), text=f"{done} of {len(sweep['futures'])} runs, {time.time() - sweep['started']:.0f} s")
+
+def parameter_sweep():
+    """
+    Sweep model parameters over a grid and rank the grid points by misfit to the constraints and UCS data.
+    """
+    names = st.multiselect("Parameters to sweep", sweep_choices("sweep_parameters"), key="sweep_parameters")
+    ranges = parameter_ranges("sweep", names)
+    grid = sweep_grid(ranges) if ranges else []
+    points = calibration_points(st.session_state.constraints, st.session_state.data_array[5])
+    st.caption(f"{len(grid)} runs against {len(points)} calibration points")
+
+    if st.button("Run sweep", use_container_width=True, disabled=not grid or points.empty):
+        previous = st.session_state.get("sweep")
+        if previous is not None:
+            # Other sessions' sweeps may be waiting on the same runs, see release_to()
+            release_to(geomech_futures("calibration"), previous["futures"])
+        st.session_state.sweep = {"grid": grid, "futures": calibration_submitter(points)(grid), "started": time.time()}
+
+    sweep = st.session_state.get("sweep")
+    if sweep is None:
+        return
+    if not all(future.done() for future in sweep["futures"]):
+        sweep_progress()
+        return
+    table = pd.DataFrame(sweep["grid"])
+    table["misfit"] = [future_misfit(future) for future in sweep["futures"]]
+    table = table.sort_values("misfit", na_position="last")
+    st.dataframe(table, hide_index=True, use_container_width=True)
+    best = table.iloc[0]
+    if np.isfinite(best["misfit"]):
+        st.button("Apply best", use_container_width=True, on_click=apply_parameters, args=(best.drop("misfit").to_dict(),))
+
+# Members per parameter in each optimizer generation
+OPTIMIZER_POPSIZE = 5
+
+def run_optimizer(submit, bounds, progress, stop, x0, **options):
+    """
+    Optimizer thread: run optimize() and record in progress how it ended.
+    """
     try:
-        with open("aliases.json", "r") as jsonfile:
-            daliases = json.load(jsonfile)
-            return daliases
-    except:
-        # Default aliases if no file exists
-        return {
-            'sonic': ['none', 'DTC', 'DT24', 'DTCO', 'DT', 'AC', 'AAC', 'DTHM'],
-            'shearsonic': ['none', 'DTSM'],
-            'gr': ['none', 'GR', 'GRD', 'CGR', 'GRR', 'GRCFM'],
-            'resdeep': ['none', 'HDRS', 'LLD', 'M2RX', 'MLR4C', 'RD', 'RT90', 'RLA1', 'RDEP', 'RLLD', 'RILD', 'ILD', 'RT_HRLT', 'RACELM'],
-            'resshal': ['none', 'LLS', 'HMRS', 'M2R1', 'RS', 'RFOC', 'ILM', 'RSFL', 'RMED', 'RACEHM'],
-            'density': ['none', 'ZDEN', 'RHOB', 'RHOZ', 'RHO', 'DEN', 'RHO8', 'BDCFM'],
-            'neutron': ['none', 'CNCF', 'NPHI', 'NEU'],
-            'pe': ['none','PE'],
-            'ROP': ['none','ROPAVG'],
-            'RPM': ['none','SURFRPM'],
-            'WOB': ['none','WOBAVG'],
-            'ECD': ['none','ACTECDM'],
-            'BIT': ['none','BIT'],
-            'TORQUE': ['none','TORQUE','TORQUEAV'],
-            'FLOWRATE': ['none','FLOWRATE','FLOWIN'],
-
-        }
+        optimize(submit, bounds, progress, stop, x0=x0, **options)
+        progress["status"] = "stopped" if stop.is_set() else "finished"
+    except Exception as error:
+        progress["status"] = f"failed: {error}"
+
+def optimizer_stats(progress):
+    """
+    Show the optimizer's generation count, evaluations, wall time, throughput and best fit so far.
+    """
+    cols = st.columns(4)
+    cols[0].metric("Generations", progress["iterations"])
+    cols[1].metric("Runs", progress["evaluations"])
+    cols[2].metric("Wall time", f"{progress['elapsed']:.0f} s")
+    cols[3].metric("Runs/s", f"{progress['evaluations'] / progress['elapsed']:.2f}" if progress["elapsed"] else "-")
+    if progress["best"] is not None:
+        st.caption(f"Best misfit {progress['misfit']:.4g} at " + ", ".join(f"{name} = {value:.4g}" for name, value in progress["best"].items()))
+
+@st.fragment(run_every=1)
+def optimizer_progress():
+    """
+    Show the running optimizer's progress, and rerun the page once it ends.
+    """
+    optimizer = st.session_state.get("optimizer")
+    if optimizer is None:
+        return
+    track_session()
+    if optimizer["progress"]["status"] is not None:
+        st.rerun()
+    optimizer_stats(optimizer["progress"])
+
+def calibration_optimizer():
+    """
+    Fit model parameters to the constraints and UCS data with differential evolution run in a background thread.
+    """
+    names = st.multiselect("Parameters to fit", sweep_choices("fit_parameters"), key="fit_parameters")
+    bounds = parameter_ranges("fit", names, count=False)
+    cols = st.columns(3)
+    maxiter = cols[0].number_input("Max generations", min_value=1, value=20, key="fit_maxiter")
+    patience = cols[1].number_input("Stop after generations without improvement", min_value=1, value=5, key="fit_patience")
+    minutes = cols[2].number_input("Time budget (min)", min_value=0.0, value=30.0, key="fit_minutes", help="0 for no limit")
+    points = calibration_points(st.session_state.constraints, st.session_state.data_array[5])
+    st.caption(f"{OPTIMIZER_POPSIZE * len(names)} runs per generation against {len(points)} calibration points")
+
+    optimizer = st.session_state.get("optimizer")
+    running = optimizer is not None and optimizer["progress"]["status"] is None
+    if running:
+        st.button("Stop optimizer", use_container_width=True, on_click=optimizer["stop"].set)
+        optimizer_progress()
+        return
+    ready = bool(names) and all(low < high for low, high in bounds.values()) and not points.empty
+    if st.button("Run optimizer", use_container_width=True, disabled=not ready):
+        progress = {"iterations": 0, "evaluations": 0, "best": None, "misfit": np.inf, "elapsed": 0.0, "status": None}
+        stop = threading.Event()
+        threading.Thread(
+            target=run_optimizer,
+            args=(calibration_submitter(points), bounds, progress, stop, {name: st.session_state[name] for name in names}),
+            kwargs={"maxiter": maxiter, "popsize": OPTIMIZER_POPSIZE, "patience": patience, "max_seconds": minutes * 60 or None,
+                    # Evaluations come from the shared calibration store, other sessions may wait on them too
+                    "release": partial(release_to, geomech_futures("calibration"))},
+            daemon=True,
+        ).start()
+        st.session_state.optimizer = {"progress": progress, "stop": stop}
+        st.rerun()
+
+    if optimizer is None:
+        return
+    st.write(f"Optimizer {optimizer['progress']['status']}")
+    optimizer_stats(optimizer["progress"])
+    if optimizer["progress"]["best"] is not None:
+        st.button("Apply fit", use_container_width=True, on_click=apply_parameters, args=(optimizer["progress"]["best"],))
+
+# Session state keys holding well-sized data, written to disk while a session is idle. The
+# deviated well in wellobj is shared through read_deviated_well()'s cache, so an idle session
+# only lets go of it, and rebuilds it from wellobj_key on return (see session_deviated_well()).
+SPILL_KEYS = ["curve_data", "outputdata", "data_array"]
+# Minutes without a page run before a session is spilled, 0 to never spill
+SPILL_MINUTES = float(os.environ.get("STRESSAPP_SPILL_MINUTES", "30"))
+SPILL_DIR = os.environ.get("STRESSAPP_SPILL_DIR", os.path.join(tempfile.gettempdir(), "stressapp-sessions"))
+# Seconds between heartbeats of an open session; a session missing them for
+# SESSION_FORGET_MINUTES has been closed, and is forgotten together with its spill file
+HEARTBEAT_SECONDS = 60
+SESSION_FORGET_MINUTES = 10
+# The Memory panel lists every session on the server only when STRESSAPP_MEMORY_ADMIN=1
+MEMORY_ADMIN = os.environ.get("STRESSAPP_MEMORY_ADMIN", "0") != "0"
+
+def object_size(value, seen=None):
+    """
+    Approximate the bytes held by a session state value.
+
+    Parameters:
+        value: Any session state value.
+        seen (set): ids of objects already counted, so shared objects count once.
+
+    Returns:
+        int: Size in bytes.
+    """
+    if seen is None:
+        seen = set()
+    if id(value) in seen:
+        return 0
+    seen.add(id(value))
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return int(np.sum(value.memory_usage(deep=True)))
+    if isinstance(value, pd.Index):
+        return int(value.memory_usage(deep=True))
+    if isinstance(value, np.ndarray):
+        # A view keeps the whole array it was taken from alive, count that once instead
+        while isinstance(value.base, np.ndarray):
+            value = value.base
+            if id(value) in seen:
+                return 0
+            seen.add(id(value))
+        return value.nbytes
+    if isinstance(value, (str, bytes)):
+        return len(value)
+    if isinstance(value, io.StringIO):
+        return len(value.getvalue())
+    if isinstance(value, io.BytesIO):
+        return value.getbuffer().nbytes
+    # Only look for wells once welly has been imported, there are none before that
+    well_class = getattr(sys.modules.get("welly"), "Well", None)
+    if well_class is not None and isinstance(value, well_class):
+        return sum(object_size(curve.df, seen) for curve in value.data.values())
+    if isinstance(value, dict):
+        return sum(object_size(item, seen) for item in value.values())
+    if isinstance(value, (list, tuple, set)):
+        return sum(object_size(item, seen) for item in value)
+    return sys.getsizeof(value)
+
+@st.cache_resource
+def session_registry():
+    """
+    Sessions seen by this server, by session id, with their last page run, last heartbeat,
+    memory and spill file. Sessions only ever change their own entry and state.
+    """
+    return {"lock": threading.Lock(), "sessions": {}}
+
+def session_entry():
+    """
+    The registry entry of the current session, or None outside a script run.
+    """
+    ctx = get_script_run_ctx()
+    if ctx is None:
+        return None
+    registry = session_registry()
+    with registry["lock"]:
+        return registry["sessions"].setdefault(ctx.session_id, {
+            "lock": threading.Lock(), "seen": time.time(), "alive": time.time(), "spilled": None, "bytes": 0,
+        })
+
+def track_session():
+    """
+    Record a run of the current session, reloading its data first if it was spilled while idle.
+
+    Called at the top of every page run, and by fragments that keep a page live during a long
+    model run, so a session watching one is never taken for idle.
+    """
+    entry = session_entry()
+    if entry is None:
+        return
+    with entry["lock"]:
+        entry["seen"] = entry["alive"] = time.time()
+        if entry["spilled"] is not None:
+            try:
+                with open(entry["spilled"], "rb") as spillfile:
+                    values = pickle.load(spillfile)
+                os.remove(entry["spilled"])
+            except OSError:
+                # Lost spill file: the pages start over from the import defaults
+                values = {}
+            restore_values(values)
+            entry["spilled"] = None
+
+def spill_dir():
+    """
+    Create SPILL_DIR readable by this user only, and check an existing one is.
+
+    Returns:
+        str: SPILL_DIR.
+    """
+    os.makedirs(SPILL_DIR, mode=0o700, exist_ok=True)
+    info = os.stat(SPILL_DIR)
+    if hasattr(os, "getuid") and (info.st_uid != os.getuid() or info.st_mode & 0o077):
+        raise PermissionError(f"{SPILL_DIR} must belong to this user with mode 0700")
+    return SPILL_DIR
+
+def spill_session(session_id, entry):
+    """
+    Move the current session's SPILL_KEYS values to a file in SPILL_DIR. Call with the entry's lock held.
+    """
+    values = {key: st.session_state[key] for key in SPILL_KEYS if key in st.session_state}
+    well = st.session_state.get("wellobj")
+    if well is not None and not rebuildable_well(well):
+        values["wellobj"] = well
+    elif well is not None:
+        values["wellobj_rebuild"] = True
+    if "outputdata" in values:
+        values["outputdata"] = detach_output(values["outputdata"], well)
+    if not values:
+        return
+    path = os.path.join(spill_dir(), f"{session_id}.pkl")
+    with open(path + ".tmp", "wb") as spillfile:
+        pickle.dump(values, spillfile, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(path + ".tmp", path)
+    entry["spilled"] = path
+    for key in SPILL_KEYS:
+        if key in values:
+            del st.session_state[key]
+    if well is not None:
+        del st.session_state["wellobj"]
+
+def session_deviated_well(digest, string_data, step, deva, neutron="None"):
+    """
+    read_deviated_well() for the current session, remembering its arguments in wellobj_key so
+    that an idle session can let go of the shared Well and rebuild it on return.
+    """
+    well = read_deviated_well(digest, string_data, step, deva, neutron)
+    st.session_state.wellobj_key = {"digest": digest, "step": step, "deva": deva, "neutron": neutron, "well": weakref.ref(well)}
+    return well
+
+def rebuildable_well(well):
+    """
+    Whether well is the read_deviated_well() result recorded in the session's wellobj_key.
+    """
+    key = st.session_state.get("wellobj_key")
+    return key is not None and key["well"]() is well
+
+def detach_output(outputdata, well):
+    """
+    outputdata without the Well its compact_frame() store references, for pickling.
+
+    A store sharing columns with the session's rebuildable well marks them to be linked again
+    on restore; columns shared with any other well are copied into the store.
+    """
+    store = outputdata[0]
+    if not isinstance(store, dict) or store["base"] is None:
+        return outputdata
+    if store["base"] is well and rebuildable_well(well):
+        store = {**store, "base": None, "base_wellobj": True}
+    else:
+        arrays = {**store["arrays"], **{name: store["base"].data[name].values for name in store["shared"]}}
+        store = {**store, "arrays": arrays, "shared": [], "base": None}
+    return [store, *outputdata[1:]]
+
+def restore_values(values):
+    """
+    Put spilled values back in the session state, rebuilding the shared deviated well and
+    linking the model output to it again.
+    """
+    well = values.pop("wellobj", None)
+    if values.pop("wellobj_rebuild", False):
+        key = st.session_state.get("wellobj_key")
+        las_file = st.session_state.get("las_file")
+        if key is not None and las_file is not None:
+            digest, string_data = read_las_string(las_file)
+            if digest == key["digest"]:
+                well = session_deviated_well(digest, string_data, key["step"], key["deva"], key["neutron"])
+    if well is not None:
+        st.session_state.wellobj = well
+    store = values.get("outputdata", [None])[0]
+    if isinstance(store, dict) and store.pop("base_wellobj", False):
+        if well is None:
+            # The output cannot be put together without its input well, run the model again
+            values.pop("outputdata")
+        else:
+            store["base"] = well
+    for key, value in values.items():
+        st.session_state[key] = value
+
+def forget_closed_sessions():
+    """
+    Drop the entries and spill files of sessions with no heartbeat for SESSION_FORGET_MINUTES.
+    """
+    now = time.time()
+    registry = session_registry()
+    with registry["lock"]:
+        closed = [session_id for session_id, entry in registry["sessions"].items()
+                  if now - entry["alive"] > SESSION_FORGET_MINUTES * 60]
+        closed = [(session_id, registry["sessions"].pop(session_id)) for session_id in closed]
+    for session_id, entry in closed:
+        if entry["spilled"] is not None and os.path.exists(entry["spilled"]):
+            os.remove(entry["spilled"])
+
+@st.fragment(run_every=HEARTBEAT_SECONDS)
+def session_heartbeat():
+    """
+    Runs in each open session every HEARTBEAT_SECONDS, in the session's own script thread.
+
+    Records the memory the session holds, spills its data once it has had no page run
+    for SPILL_MINUTES, and forgets sessions that have been closed.
+    """
+    ctx = get_script_run_ctx()
+    entry = session_entry()
+    if entry is None:
+        return
+    with entry["lock"]:
+        entry["alive"] = time.time()
+        entry["bytes"] = object_size(st.session_state.to_dict())
+        if SPILL_MINUTES > 0 and entry["spilled"] is None and time.time() - entry["seen"] > SPILL_MINUTES * 60:
+            try:
+                spill_session(ctx.session_id, entry)
+            except (OSError, pickle.PicklingError):
+                pass
+    forget_closed_sessions()
+
+def memory_report():
+    """
+    Show the memory held by this session by key and, with MEMORY_ADMIN, by every session on the server.
+    """
+    state = st.session_state.to_dict()
+    sizes = pd.Series({key: object_size(value) for key, value in state.items()}, dtype=float) / 1e6
+    sizes = sizes[sizes >= 0.01].sort_values(ascending=False)
+    st.write(f"This session: {sizes.sum():.1f} MB")
+    st.dataframe(sizes.rename("MB").round(2), use_container_width=True)
+    if not MEMORY_ADMIN:
+        return
+
+    ctx = get_script_run_ctx()
+    registry = session_registry()
+    with registry["lock"]:
+        sessions = list(registry["sessions"].items())
+    rows = []
+    for session_id, entry in sessions:
+        with entry["lock"]:
+            rows.append({
+                "session": session_id[:8] + (" (this)" if ctx is not None and session_id == ctx.session_id else ""),
+                "idle min": round((time.time() - entry["seen"]) / 60, 1),
+                "spilled": entry["spilled"] is not None,
+                "MB": round(entry["bytes"] / 1e6, 2),
+            })
+    st.write(f"All sessions: {sum(row['MB'] for row in rows):.1f} MB")
+    st.caption(f"As of each session's last heartbeat, every {HEARTBEAT_SECONDS} s. Objects shared between sessions, like a cached well, count in each.")
+    st.dataframe(pd.DataFrame(rows, columns=["session", "idle min", "spilled", "MB"]), hide_index=True, use_container_width=True)
+
+# Default aliases if no file exists
+DEFAULT_ALIASES = {
+    'sonic': ['none', 'DTC', 'DT24', 'DTCO', 'DT', 'AC', 'AAC', 'DTHM'],
+    'shearsonic': ['none', 'DTSM'],
+    'gr': ['none', 'GR', 'GRD', 'CGR', 'GRR', 'GRCFM'],
+    'resdeep': ['none', 'HDRS', 'LLD', 'M2RX', 'MLR4C', 'RD', 'RT90', 'RLA1', 'RDEP', 'RLLD', 'RILD', 'ILD', 'RT_HRLT', 'RACELM'],
+    'resshal': ['none', 'LLS', 'HMRS', 'M2R1', 'RS', 'RFOC', 'ILM', 'RSFL', 'RMED', 'RACEHM'],
+    'density': ['none', 'ZDEN', 'RHOB', 'RHOZ', 'RHO', 'DEN', 'RHO8', 'BDCFM'],
+    'neutron': ['none', 'CNCF', 'NPHI', 'NEU'],
+    'pe': ['none','PE'],
+    'ROP': ['none','ROPAVG'],
+    'RPM': ['none','SURFRPM'],
+    'WOB': ['none','WOBAVG'],
+    'ECD': ['none','ACTECDM'],
+    'BIT': ['none','BIT'],
+    'TORQUE': ['none','TORQUE','TORQUEAV'],
+    'FLOWRATE': ['none','FLOWRATE','FLOWIN'],
+
+}
+
+# The shared alias file, and a directory for per-user alias overlays (off unless set).
+# A user's overlay holds only the alias groups they changed, on top of the shared file.
+ALIAS_FILE = os.environ.get("STRESSAPP_ALIAS_FILE", "aliases.json")
+USER_ALIAS_DIR = os.environ.get("STRESSAPP_USER_ALIAS_DIR")
+
+# Alias files read by this process, by path: (mtime_ns, size, aliases). Shared by all sessions
+# and re-read only when the file changes on disk; writes go through the same lock.
+_alias_files = {}
+_alias_lock = threading.Lock()
+
+def read_alias_file(path):
+    """
+    The aliases in a JSON file, from the shared cache while the file is unchanged on disk.
+
+    Parameters:
+        path (str): The alias file.
+
+    Returns:
+        dict: A copy of the aliases, or None if the file is missing or unreadable.
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    with _alias_lock:
+        cached = _alias_files.get(path)
+        if cached is None or cached[:2] != (stat.st_mtime_ns, stat.st_size):
+            try:
+                with open(path, "r") as jsonfile:
+                    aliases = json.load(jsonfile)
+            except (OSError, ValueError):
+                return None
+            cached = (stat.st_mtime_ns, stat.st_size, aliases)
+            _alias_files[path] = cached
+        return copy.deepcopy(cached[2])
+
+def write_alias_file(path, aliases):
+    """
+    Write aliases to a JSON file if they differ from its content.
+
+    The file is written to a temporary file next to it and moved into place, so readers
+    never see a partly written file.
+
+    Parameters:
+        path (str): The alias file.
+        aliases (dict): Alias name to candidate mnemonics.
+
+    Returns:
+        bool: Whether the file was written.
+    """
+    if read_alias_file(path) == aliases:
+        return False
+    folder = os.path.dirname(os.path.abspath(path))
+    os.makedirs(folder, exist_ok=True)
+    with _alias_lock:
+        handle, temporary = tempfile.mkstemp(dir=folder, prefix=".aliases-", suffix=".json")
+        try:
+            with os.fdopen(handle, "w") as jsonfile:
+                json.dump(aliases, jsonfile, indent=4)
+            os.replace(temporary, path)
+        except BaseException:
+            if os.path.exists(temporary):
+                os.remove(temporary)
+            raise
+        stat = os.stat(path)
+        _alias_files[path] = (stat.st_mtime_ns, stat.st_size, copy.deepcopy(aliases))
+    return True
+
+def alias_user():
+    """
+    The signed in user whose alias overlay applies, or None when overlays are off or no one is signed in.
+    """
+    if not USER_ALIAS_DIR:
+        return None
+    try:
+        return st.user.get("email")
+    except Exception:
+        return None
+
+def user_alias_file(user):
+    """
+    The overlay file of a user in USER_ALIAS_DIR.
+    """
+    return os.path.join(USER_ALIAS_DIR, hashlib.sha1(user.encode("utf-8")).hexdigest()[:16] + ".json")
+
+# Function to load aliases from JSON file
+def load_aliases(user=None):
+    """
+    The shared aliases, with the overlay of user on top.
+
+    Parameters:
+        user (str): Output of alias_user(), or None for the shared aliases only.
+
+    Returns:
+        dict: Alias name to candidate mnemonics.
+    """
+    aliases = read_alias_file(ALIAS_FILE)
+    if aliases is None:
+        aliases = copy.deepcopy(DEFAULT_ALIASES)
+    if user is not None and USER_ALIAS_DIR:
+        aliases.update(read_alias_file(user_alias_file(user)) or {})
+    return aliases
 
 # Function to save aliases to JSON file
-def save_aliases(aliases):
-    with open("aliases.json", "w") as jsonfile:
-        json.dump(aliases, jsonfile, indent=4)
+def save_aliases(aliases, user=None):
+    """
+    Save aliases, only writing when they changed.
 
+    With a user, the alias groups that differ from the shared file go to their overlay
+    and the shared file is left alone.
 
+    Parameters:
+        aliases (dict): Alias name to candidate mnemonics.
+        user (str): Output of alias_user(), or None to save to the shared file.
+
+    Returns:
+        bool: Whether a file was written.
+    """
+    if user is None or not USER_ALIAS_DIR:
+        return write_alias_file(ALIAS_FILE, aliases)
+    shared = load_aliases()
+    overlay = {key: value for key, value in aliases.items() if shared.get(key) != value}
+    path = user_alias_file(user)
+    if not overlay and not os.path.exists(path):
+        return False
+    return write_alias_file(path, overlay)
+
+# Units and description words of the curves each alias group stands for, used to choose
+# between curves that match the same mnemonic and to rank suggested curves
+ALIAS_UNITS = {
+    "sonic": ["us/ft", "us/f", "uspf", "us/m"],
+    "shearsonic": ["us/ft", "us/f", "uspf", "us/m"],
+    "gr": ["gapi", "api"],
+    "resdeep": ["ohmm", "ohm.m", "ohm-m", "ohm"],
+    "resshal": ["ohmm", "ohm.m", "ohm-m", "ohm"],
+    "density": ["g/cc", "g/cm3", "gm/cc", "kg/m3"],
+    "neutron": ["v/v", "pu", "%", "dec", "frac", "cfcf"],
+    "pe": ["b/e", "b/elec"],
+}
+ALIAS_WORDS = {
+    "sonic": ["compressional", "sonic", "delta-t", "slowness"],
+    "shearsonic": ["shear"],
+    "gr": ["gamma"],
+    "resdeep": ["deep"],
+    "resshal": ["shallow", "medium", "micro"],
+    "density": ["density"],
+    "neutron": ["neutron"],
+    "pe": ["photoelectric"],
+    "ROP": ["penetration"],
+    "RPM": ["rpm", "rotary speed"],
+    "WOB": ["weight on bit"],
+    "ECD": ["equivalent circulating"],
+    "TORQUE": ["torque"],
+    "FLOWRATE": ["flow"],
+}
+
+def curve_info(well):
+    """
+    Units and descriptions of the curves in a well, from its LAS header.
+
+    Parameters:
+        well (Well): The Welly Well object.
+
+    Returns:
+        dict: Mnemonic to (units, description), both lower case.
+    """
+    return {
+        name: (str(getattr(curve, "units", "") or "").lower().replace(" ", ""),
+               str(getattr(curve, "description", "") or "").lower())
+        for name, curve in well.data.items()
+    }
+
+def mnemonic_index(curve_names):
+    """
+    Index the curves of a well by upper case mnemonic.
+
+    lasio renames repeated mnemonics DT:1, DT:2, ..., so that suffix is left out of the key
+    and the copies are indexed together, for curve_score() to choose between.
+
+    Returns:
+        dict: Upper case mnemonic to the curve names with it, in well order.
+    """
+    index = {}
+    for name in curve_names:
+        index.setdefault(re.sub(r":\d+$", "", str(name).strip()).upper(), []).append(name)
+    return index
+
+def curve_score(alias, info):
+    """
+    How well a curve's units and description fit an alias group: 2 for the units, 1 for the description.
+    """
+    if info is None:
+        return 0
+    units, description = info
+    return 2 * (units in ALIAS_UNITS.get(alias, [])) + any(word in description for word in ALIAS_WORDS.get(alias, []))
+
+def resolve_aliases(aliases, curve_names, curves=None):
+    """
+    Pick the first curve of each alias group that is present in the well.
+
+    Mnemonics are matched regardless of case through one index of the well's curves. Where
+    several curves match, the one whose units and description fit the group is taken.
+
+    Parameters:
+        aliases (dict): Alias name to a list of candidate mnemonics, as in aliases.json.
+        curve_names (iterable): Mnemonics of the curves in the well.
+        curves (dict): Output of curve_info() for the well, or None.
+
+    Returns:
+        tuple: (dict of alias to mnemonic or 'None', list of aliases with no match)
+    """
+    curves = curves or {}
+    index = mnemonic_index(curve_names)
+    alias = {}
+    missing = []
+    for key, alias_group in aliases.items():
+        match = "None"
+        for candidate in alias_group:
+            if candidate is None or str(candidate).lower() == "none":
+                continue
+            names = index.get(str(candidate).strip().upper())
+            if names:
+                match = max(names, key=lambda name: curve_score(key, curves.get(name)))
+                break
+        alias[key] = match
+        if match == "None":
+            missing.append(key)
+    return alias, missing
+
+def suggest_aliases(aliases, missing, curve_names, curves=None, limit=3):
+    """
+    Curves that look like a missing alias, such as DTCO_1 or DTCO:2 for DTCO and RHOZ_FIN for RHOZ.
+
+    A curve is suggested when its mnemonic up to the first _ . : or - is a candidate of the
+    group, or when it is close to one (difflib ratio of at least 0.8). Curves already resolved
+    to an alias are left out. Suggestions are ranked by curve_score(), then by closeness.
+
+    Parameters:
+        aliases (dict): Alias name to candidate mnemonics.
+        missing (list): Aliases with no match, from resolve_aliases().
+        curve_names (iterable): Mnemonics of the curves in the well.
+        curves (dict): Output of curve_info() for the well, or None.
+        limit (int): Suggestions per alias.
+
+    Returns:
+        dict: Alias to a list of curve names, for aliases with suggestions.
+    """
+    import difflib
+    curves = curves or {}
+    resolved, _ = resolve_aliases(aliases, curve_names, curves)
+    taken = set(resolved.values())
+    index = {key: names for key, names in mnemonic_index(curve_names).items()
+             if any(name not in taken for name in names)}
+    suggestions = {}
+    for key in missing:
+        candidates = {str(candidate).strip().upper() for candidate in aliases.get(key, [])
+                      if candidate is not None and str(candidate).lower() != "none"}
+        if not candidates:
+            continue
+        closeness = {mnemonic: 1.0 for mnemonic in index if re.split(r"[_.:\-]", mnemonic)[0] in candidates}
+        for candidate in candidates:
+            for mnemonic in difflib.get_close_matches(candidate, index, n=limit, cutoff=0.8):
+                ratio = difflib.SequenceMatcher(None, mnemonic, candidate).ratio()
+                closeness[mnemonic] = max(closeness.get(mnemonic, 0.0), ratio)
+        ranked = {name: (curve_score(key, curves.get(name)), value)
+                  for mnemonic, value in closeness.items() for name in index[mnemonic] if name not in taken}
+        if ranked:
+            suggestions[key] = sorted(ranked, key=lambda name: ranked[name], reverse=True)[:limit]
+    return suggestions
+
+def first_suggestions(suggestions):
+    """
+    The first suggested curve of each missing alias, never the same curve for two aliases.
+
+    Parameters:
+        suggestions (dict): Output of suggest_aliases().
+
+    Returns:
+        dict: Alias name to a curve name.
+    """
+    picked = {}
+    for alias, names in suggestions.items():
+        name = next((name for name in names if name not in picked.values()), None)
+        if name is not None:
+            picked[alias] = name
+    return picked
+
+def header_well_info(well):
+    """
+    Default well_info fields, with the elevations taken from the LAS header where present.
+
+    Parameters:
+        well (Well): The Welly Well object.
+
+    Returns:
+        dict: Field name to string value.
+    """
+    header = well.header.set_index("mnemonic")["value"]
+    olakb = 1
+    olagl = 0
+    for mnemonic in ["KB", "EKB"]:
+        if mnemonic in header.index:
+            olakb = header.loc[mnemonic]
+    for mnemonic in ["GL", "EGL"]:
+        if mnemonic in header.index:
+            olagl = header.loc[mnemonic]
+    return {
+        'Well Name': getattr(well, 'name', '') or '',
+        'Well UWI/API': getattr(well, 'uwi', '') or getattr(well, 'api', '') or '',
+        'Kelly Bushing Elevation': str(olakb),
+        'Ground Level Elevation': str(olagl),
+        'Water Table Elevation': '0',
+        'Bottom Hole Temperature': '',
+        'Latitude': str(getattr(well.location, 'lat', '') or ''),
+        'Longitude': str(getattr(well.location, 'lon', '') or ''),
+        'Mud resistance': '',
+        'Mud Filtrate Resistance': ''
+    }
+
+def neutron_to_fraction(wella, mnemonic):
+    """
+    Replace a neutron porosity curve given in percent with one in v/v, the unit plotPPzhang expects.
+
+    Parameters:
+        wella (Well): The deviated Welly Well object, with an MD curve.
+        mnemonic (str): The neutron curve.
+    """
+    neutron = wella.data[mnemonic].values
+    corneu = neutron/100 if np.nanmean(neutron)>1 else neutron
+    md = wella.data["MD"].values
+    from welly import Curve
+    wella.data[mnemonic] = Curve(corneu, mnemonic=mnemonic, units='v/v', index=md, null=-999.25)
 
 # Function to get aliases
 missing_aliases = []
@@ -647,16 +2109,16 @@ def get_missing_aliases():
             # Display multiselect and add current selections
             new_selection = st.multiselect(
                 f"Select curve for {alias}", 
-                options=["None"] + list(st.session_state.curve_data.columns),
+                options=["None"] + frame_axes(st.session_state.curve_data)[1],
                 default=["None"]
             )
             
-            # Update the alias with new and existing selections, avoiding duplicates
-            updated_selection = list(set(current_selection + new_selection))
+            # Update the alias with new and existing selections, avoiding duplicates and keeping their order
+            updated_selection = current_selection + [value for value in new_selection if value not in current_selection]
             st.session_state.aliases[alias] = updated_selection
         
         # Save updated aliases to JSON
-        save_aliases(st.session_state.aliases)
+        save_aliases(st.session_state.aliases, alias_user())
         
         #st.write(st.session_state.aliases)
     
@@ -716,6 +2178,7 @@ def get_df_from_user(headers, array_num, units=None):
         st.subheader("Column Mapping and Unit Conversion")
         
         # Create a ureg (unit registry) for conversion
+        import pint
         ureg = pint.UnitRegistry()
         
         # Processed DataFrame to return
@@ -0,0 +1,198 @@
+"""
+Copyright (c) 2024-2025 ROCK LAB PRIVATE LIMITED
+This file is part of "The Stress App" project and is released under the 
+GNU Affero General Public License v3.0 (AGPL-3.0)
+See the GNU Affero General Public License for more details: <https://www.gnu.org/licenses/agpl-3.0.html>
+"""
+
+# Model runs, kept free of streamlit so worker processes can import them
+
+import pandas as pd
+import numpy as np
+import hashlib
+import copy
+import re
+
+# Model parameters as first shown on the Geomech page
+GEOMECH_DEFAULTS = {
+    "lamb": 0.0008, "ul_exp": 0.0008, "ul_depth": 0.0, "dtml": 210.0,
+    "dtmt": 60.0, "water": 1.0, "underbalancereject": 1.0, "sfs": 1.0,
+    "rhoappg": 16.33, "a": 0.630, "nu": 0.25, "tecb": 0.0,
+    "offset": 0.0, "strike": 0.0, "dip": 0.0,
+    "lala": -1.0, "lalb": 1.0, "lalm": 5.0, "lale": 0.5, "lall": 5.0,
+    "horsuda": 0.77, "horsude": 2.93, "doi": 0.0, "mudtemp": 0.0,"program_option" : 4,
+    "res0":0.98, "be":0.00014, "ne":0.6, "dex0":0.5, "de":0.00014, "nde":0.5,
+}
+
+# plotPPzhang keyword arguments among the parameters; the depth of interest is passed on its own
+MODEL_PARAMETERS = [key for key in GEOMECH_DEFAULTS if key != "doi"]
+
+def geomech_parameters(state):
+    """
+    Collect the plotPPzhang parameters from the session state.
+
+    Parameters:
+        state (dict-like): st.session_state or any mapping holding the model parameters.
+
+    Returns:
+        dict: plotPPzhang keyword arguments.
+    """
+    parameters = {key: state[key] for key in MODEL_PARAMETERS}
+    if parameters["ul_depth"] == 0:
+        parameters["ul_exp"] = parameters["lamb"]
+    parameters["program_option"] = [300, parameters["program_option"], 0, 0, 0]
+    return parameters
+
+def well_fingerprint(wella):
+    """
+    Digest of the curves and deviation survey of a well, used to key model runs.
+
+    Parameters:
+        wella (Well): The Welly Well object.
+
+    Returns:
+        str: sha1 hex digest.
+    """
+    digest = hashlib.sha1()
+    for name, curve in wella.data.items():
+        digest.update(name.encode())
+        digest.update(pd.util.hash_pandas_object(curve.df).values.tobytes())
+    if wella.location.deviation is not None:
+        digest.update(np.ascontiguousarray(wella.location.deviation).tobytes())
+    return digest.hexdigest()
+
+# Columns of the casing, bit and mud table, in the order plotPPzhang reads mwvalues
+MUD_COLUMNS = ["MaxMudWeight", "Shoe Depth", "Bit Dia", "Casing Dia", "Mud Motor ID", "Section BHT"]
+# well_info fields, in the order plotPPzhang reads attrib
+WELL_ATTRIBUTES = ["Kelly Bushing Elevation", "Ground Level Elevation", "Water Table Elevation", "Latitude",
+                   "Longitude", "Bottom Hole Temperature", "Mud resistance", "Mud Filtrate Resistance"]
+
+def mud_schedule(mudattributedf):
+    """
+    Convert the casing, bit and mud table into plotPPzhang mwvalues.
+
+    Parameters:
+        mudattributedf (DataFrame or None): Table with the MUD_COLUMNS.
+
+    Returns:
+        list: One [mud weight, shoe depth, bit dia, casing dia, motor id, BHT] row per section.
+    """
+    if mudattributedf is None or mudattributedf.empty:
+        return [[1.0, 0.0, 0.0, 0.0, 0.0, 0]]
+    numeric = mudattributedf[MUD_COLUMNS].drop(columns="Mud Motor ID").apply(pd.to_numeric, errors="coerce")
+    weight = numeric.pop("MaxMudWeight").fillna(1.0).to_numpy(dtype=float)
+    numeric = numeric.fillna(0.0).to_numpy(dtype=float)
+    motor = mudattributedf["Mud Motor ID"].fillna("0").astype(str).to_numpy()
+    return [[w, shoe, bit, casing, m, bht] for w, (shoe, bit, casing, bht), m in zip(weight.tolist(), numeric.tolist(), motor.tolist())]
+
+def well_attributes(well_info):
+    """
+    Convert the well_info strings into plotPPzhang attrib.
+
+    Parameters:
+        well_info (dict): Well header fields as entered on the import page.
+
+    Returns:
+        list: The WELL_ATTRIBUTES as floats, blanks read as 0.
+    """
+    return [float(well_info.get(key, "0") or "0") for key in WELL_ATTRIBUTES]
+
+def run_inputs(mudattributedf, well_info, alias):
+    """
+    Build the plotPPzhang inputs that come from the well data page rather than the model parameters.
+
+    Parameters:
+        mudattributedf (DataFrame or None): The casing, bit and mud table.
+        well_info (dict): Well header fields.
+        alias (dict): Curve mnemonic per log type.
+
+    Returns:
+        dict: mwvalues, attrib and aliasdict.
+    """
+    return {
+        "mwvalues": mud_schedule(mudattributedf),
+        "attrib": well_attributes(well_info),
+        "aliasdict": {key: [value] for key, value in alias.items()},
+    }
+
+def run_key(*parts):
+    """
+    Digest of the inputs of a model run.
+
+    Parameters:
+        *parts: Strings, numbers, lists, dicts, DataFrames or None.
+
+    Returns:
+        str: sha1 hex digest.
+    """
+    digest = hashlib.sha1()
+    for part in parts:
+        if isinstance(part, pd.DataFrame):
+            digest.update(repr(list(part.columns)).encode())
+            digest.update(pd.util.hash_pandas_object(part).values.tobytes())
+        else:
+            digest.update(repr(part).encode())
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+def run_geomech(well, parameters, mwvalues, attrib, aliasdict, forms=None, flags=None, lithos=None, doi=0.0):
+    """
+    Run plotPPzhang.
+
+    The model runs on a copy of the well, since plotPPzhang adds its output curves
+    to the well it is given and a second run on the same object gives different results.
+
+    Parameters:
+        well (Well): The deviated Welly Well object.
+        parameters (dict): Output of geomech_parameters().
+        mwvalues, attrib, aliasdict, forms, flags, lithos, doi: Passed through to plotPPzhang.
+
+    Returns:
+        tuple: The plotPPzhang outputs, with only the header of the LAS text (see las_chunks()).
+    """
+    # stresslog takes seconds to import, so it is only loaded by the first model run
+    import stresslog as lsd
+    result = lsd.plotPPzhang(
+        copy.deepcopy(well), window=1, zulu=0, tango=20000, doi=doi,
+        mwvalues=mwvalues, forms=forms, flags=flags, lithos=lithos,
+        writeFile=False, attrib=attrib, aliasdict=aliasdict, **parameters
+    )
+    if result[1] is None:
+        return result
+    return (result[0], las_header(result[1])) + tuple(result[2:])
+
+# Rows of the ~A section formatted at a time
+LAS_BLOCK_ROWS = 2000
+
+def las_header(text):
+    """
+    The LAS text up to and including its ~A line.
+    """
+    start = text.find("\n~A")
+    end = text.find("\n", start + 1)
+    return text if start < 0 or end < 0 else text[:end + 1]
+
+def las_chunks(header, df, block_rows=LAS_BLOCK_ROWS):
+    """
+    Yield a LAS file in pieces: the header, then the ~A section a block of rows at a time.
+
+    The data lines are formatted as lasio writes them for plotPPzhang, each value as %.5f
+    right-justified to 10 characters after a space, with nan written as the header's NULL value.
+
+    Parameters:
+        header (str): Output of las_header(), whose curves are the columns of df in order.
+        df (DataFrame): The first plotPPzhang output.
+        block_rows (int): Rows formatted per piece.
+
+    Yields:
+        str: The header, then newline terminated blocks of data lines.
+    """
+    yield header
+    null = re.search(r"^\s*NULL\s*\.\S*\s+(\S+)\s*:", header, re.MULTILINE)
+    null = (null.group(1) if null else "-999.25").rjust(10)
+    row_format = " %10.5f" * df.shape[1]
+    values = df.to_numpy(dtype=float)
+    for start in range(0, len(values), block_rows):
+        block = values[start:start + block_rows].tolist()
+        text = "\n".join(row_format % tuple(row) for row in block)
+        yield text.replace("nan".rjust(10), null) + "\n"
@@ -0,0 +1,26 @@
+"""
+Copyright (c) 2024-2025 ROCK LAB PRIVATE LIMITED
+This file is part of "The Stress App" project and is released under the 
+GNU Affero General Public License v3.0 (AGPL-3.0)
+See the GNU Affero General Public License for more details: <https://www.gnu.org/licenses/agpl-3.0.html>
+"""
+
+# Preloaded by the forkserver that starts the model run workers (see geomech_pool() in
+# common_functions). The forkserver is a fresh interpreter, so workers forked from it share
+# neither the locks nor the heap of the streamlit server, and find stresslog already imported.
+
+import multiprocessing.spawn
+
+def skip_main(*args):
+    """
+    Stand-in for multiprocessing's set up of the parent's __main__ in a new worker.
+    """
+
+# streamlit registers the page script being run as __main__, and multiprocessing would run
+# it again in every new worker. Workers only ever call geomech and calibration functions.
+multiprocessing.spawn._fixup_main_from_path = skip_main
+multiprocessing.spawn._fixup_main_from_name = skip_main
+
+import stresslog  # noqa: E402,F401
+import geomech  # noqa: E402,F401
+import calibration  # noqa: E402,F401
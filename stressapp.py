@@ -7,6 +7,7 @@ See the GNU Affero General Public License for more details: <https://www.gnu.org
 
 import streamlit as st
 st.set_page_config(layout="wide")
+from common_functions import track_session, session_heartbeat, memory_report
 
 def changeUI():
     if st.session_state.mobile_version:
@@ -19,6 +20,14 @@ if "mobile_version" not in st.session_state:
     st.session_state.mobile_version = False
 st.sidebar.toggle("Mobile UI", on_change=changeUI)
 
+# Reload this session's data if it was spilled to disk while idle, before any page reads it
+track_session()
+with st.sidebar:
+    session_heartbeat()
+with st.sidebar.expander("Memory"):
+    if st.toggle("Show memory use", key="show_memory"):
+        memory_report()
+
 
 input_page = st.Page("_1_Import.py", title="Import Data", icon=":material/upload_file:")
 geomech_page = st.Page("_2_Geomech.py", title="Calculate Stresses", icon=":material/modeling:")
@@ -0,0 +1,18 @@
+"""
+Copyright (c) 2024-2025 ROCK LAB PRIVATE LIMITED
+This file is part of "The Stress App" project and is released under the
+GNU Affero General Public License v3.0 (AGPL-3.0)
+See the GNU Affero General Public License for more details: <https://www.gnu.org/licenses/agpl-3.0.html>
+"""
+
+# The app modules live at the top of the repository, next to this folder
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from streamlit import logger
+
+# Outside a streamlit server the cached helpers warn that there is no runtime
+logger.set_log_level("error")
@@ -0,0 +1,42 @@
+"""
+Copyright (c) 2024-2025 ROCK LAB PRIVATE LIMITED
+This file is part of "The Stress App" project and is released under the
+GNU Affero General Public License v3.0 (AGPL-3.0)
+See the GNU Affero General Public License for more details: <https://www.gnu.org/licenses/agpl-3.0.html>
+"""
+
+# Alias resolution of wells whose mnemonics lasio has renamed, and the one-click suggestions.
+
+import io
+
+import lasio
+import numpy as np
+from welly import Well
+
+from common_functions import DEFAULT_ALIASES, curve_info, first_suggestions, resolve_aliases
+
+def duplicate_sonic_well():
+    """
+    A well with two DT curves, which lasio reads as DT:1 and DT:2.
+    """
+    las = lasio.LASFile()
+    depth = np.arange(1000.0, 1010.0, 0.5)
+    las.append_curve("DEPT", depth, unit="m")
+    las.append_curve("DT", np.full(len(depth), 0.3), unit="ms", descr="Transit time")
+    las.append_curve("DT", np.full(len(depth), 90.0), unit="us/ft", descr="Delta-T compressional")
+    las.append_curve("GR", np.full(len(depth), 60.0), unit="gAPI")
+    text = io.StringIO()
+    las.write(text, version=2.0)
+    return Well.from_las(text.getvalue())
+
+def test_duplicate_mnemonics_resolve_by_units():
+    well = duplicate_sonic_well()
+    assert {"DT:1", "DT:2"} <= set(well.data)
+    alias, missing = resolve_aliases(DEFAULT_ALIASES, well.data.keys(), curve_info(well))
+    assert alias["sonic"] == "DT:2"
+    assert "sonic" not in missing
+    assert alias["gr"] == "GR"
+
+def test_first_suggestions_never_repeat_a_curve():
+    suggestions = {"sonic": ["DTCO_1", "DTCO_2"], "shearsonic": ["DTCO_1", "DTSM_X"], "pe": ["DTCO_1"]}
+    assert first_suggestions(suggestions) == {"sonic": "DTCO_1", "shearsonic": "DTSM_X"}
@@ -0,0 +1,24 @@
+"""
+Copyright (c) 2024-2025 ROCK LAB PRIVATE LIMITED
+This file is part of "The Stress App" project and is released under the
+GNU Affero General Public License v3.0 (AGPL-3.0)
+See the GNU Affero General Public License for more details: <https://www.gnu.org/licenses/agpl-3.0.html>
+"""
+
+# The Excel caption reports the sheet split up front and the build time once a workbook is built.
+
+import numpy as np
+import pandas as pd
+
+from common_functions import EXCEL_MAX_ROWS, excel_note, excel_sheets, export_excel
+
+def test_excel_sheets_split():
+    per_sheet = EXCEL_MAX_ROWS - 1
+    assert excel_sheets(10) == [(0, 10)]
+    assert excel_sheets(per_sheet + 1) == [(0, per_sheet), (per_sheet, per_sheet + 1)]
+
+def test_excel_note_reports_build_time():
+    frame = pd.DataFrame({"DEPT": np.arange(100.0), "PP": np.linspace(1000.0, 2000.0, 100)})
+    assert excel_note("excel-note-test", frame) == ""
+    export_excel("excel-note-test", frame)
+    assert excel_note("excel-note-test", frame).startswith("Built in ")
@@ -0,0 +1,83 @@
+"""
+Copyright (c) 2024-2025 ROCK LAB PRIVATE LIMITED
+This file is part of "The Stress App" project and is released under the
+GNU Affero General Public License v3.0 (AGPL-3.0)
+See the GNU Affero General Public License for more details: <https://www.gnu.org/licenses/agpl-3.0.html>
+"""
+
+# getwelldev builds its surface padding with arrays; the MD and TVDM curves must match
+# the while loop it replaced.
+
+import io
+
+import lasio
+import numpy as np
+import pandas as pd
+import pytest
+from welly import Well, curve
+
+from common_functions import getwelldev
+
+def legacy_getwelldev(wella, deva=None, step=None):
+    """
+    getwelldev as it was before the padding was built with arrays.
+    """
+    depth_track = wella.df().index
+    start_depth = wella.df().index[0]
+    spacing = ((wella.df().index.values[-1]-wella.df().index.values[0])/len(wella.df().index.values))
+    if step is not None:
+        spacing = step
+    padlength = int(start_depth/spacing)
+    padval = np.zeros(padlength)
+    i = 1
+    while(i<padlength):
+        padval[-i] = start_depth-(spacing*i)
+        i+=1
+    md = np.append(padval,depth_track)
+    if deva is not None:
+        inc = np.interp(md,pd.to_numeric(deva["MD"], errors='coerce'),pd.to_numeric(deva["INC"], errors='coerce'))
+        azm = np.interp(md,pd.to_numeric(deva["MD"], errors='coerce'),pd.to_numeric(deva["AZIM"], errors='coerce'))
+    else:
+        inc = np.zeros(len(md))
+        azm = np.zeros(len(md))
+    dz = pd.DataFrame(np.transpose([md,inc,azm])).dropna()
+    wella.location.add_deviation(dz, wella.location.td)
+    tvdg = wella.location.tvd
+    md = wella.location.md
+    wella.data['MD'] = curve.Curve(md, mnemonic='MD',units='m', index = md)
+    wella.data['TVDM'] = curve.Curve(tvdg, mnemonic='TVDM',units='m', index = md)
+    wella.unify_basis(keys=None, alias=None, step=spacing)
+    return wella
+
+def las_text(start, stop, step):
+    """
+    A LAS file with a GR curve from start to stop m.
+    """
+    las = lasio.LASFile()
+    depth = np.arange(start, stop + step / 2, step)
+    las.append_curve("DEPT", depth, unit="m")
+    las.append_curve("GR", 50 + 30 * np.sin(depth / 7), unit="gAPI")
+    text = io.StringIO()
+    las.write(text, version=2.0)
+    return text.getvalue()
+
+SURVEY = pd.DataFrame({
+    "MD": [0.0, 300.0, 600.0, 900.0, 1500.0],
+    "INC": [0.0, 0.0, 12.0, 35.0, 40.0],
+    "AZIM": [0.0, 0.0, 45.0, 60.0, 62.0],
+})
+
+@pytest.mark.parametrize("start, stop, log_step, step, deva", [
+    (500.0, 1200.0, 0.5, None, SURVEY),
+    (500.0, 1200.0, 0.5, 5, SURVEY),
+    (500.0, 1200.0, 0.5, 5, None),
+    (12.3, 40.0, 0.1, 0.1, None),
+    (12.3, 40.0, 0.1, 0.1, SURVEY),
+])
+def test_md_tvdm_match_legacy(start, stop, log_step, step, deva):
+    text = las_text(start, stop, log_step)
+    new = getwelldev(wella=Well.from_las(text, index="m"), deva=deva, step=step)
+    old = legacy_getwelldev(Well.from_las(text, index="m"), deva=deva, step=step)
+    for name in ["MD", "TVDM"]:
+        np.testing.assert_array_equal(new.data[name].index, old.data[name].index)
+        np.testing.assert_array_equal(new.data[name].values, old.data[name].values)
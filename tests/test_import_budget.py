@@ -0,0 +1,70 @@
+"""
+Copyright (c) 2024-2025 ROCK LAB PRIVATE LIMITED
+This file is part of "The Stress App" project and is released under the
+GNU Affero General Public License v3.0 (AGPL-3.0)
+See the GNU Affero General Public License for more details: <https://www.gnu.org/licenses/agpl-3.0.html>
+"""
+
+# Cold-start import cost of the app entry point and each page, checked against a budget.
+# The top level imports of each script are run in a fresh interpreter under -X importtime.
+# A page fails if they take longer than the budget (STRESSAPP_IMPORT_BUDGET seconds to
+# override it on a slow machine), or if they load one of the libraries that are only
+# imported on first use.
+
+import ast
+import os
+import subprocess
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PAGES = ["stressapp.py", "_1_Import.py", "_2_Geomech.py", "_3_Export.py", "_4_I_mob.py", "_5_G_mob.py", "_6_E_mob.py"]
+# Seconds for the top level imports of one page, measured cold
+PAGE_BUDGET_SECONDS = float(os.environ.get("STRESSAPP_IMPORT_BUDGET", "2.0"))
+DEFERRED_MODULES = ["welly", "stresslog", "scipy", "pint", "matplotlib"]
+
+def top_level_imports(path):
+    """
+    The import statements at the top level of a script, as source.
+    """
+    with open(path, "r") as script:
+        tree = ast.parse(script.read())
+    return "\n".join(ast.unparse(node) for node in tree.body if isinstance(node, (ast.Import, ast.ImportFrom)))
+
+def measure_imports(source, cwd):
+    """
+    Run import statements in a fresh interpreter under -X importtime.
+
+    Parameters:
+        source (str): The import statements.
+        cwd (str): Directory to run them from.
+
+    Returns:
+        tuple: (total seconds, seconds per directly imported module, seconds per module including nested ones).
+    """
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", source], cwd=cwd,
+                            capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+    modules, direct = {}, {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if not cumulative.strip().isdigit():
+            continue
+        seconds = int(cumulative) / 1e6
+        modules[name.strip()] = seconds
+        # Nested imports are indented by two more spaces per level
+        if len(name) - len(name.lstrip()) == 1:
+            direct[name.strip()] = seconds
+    return sum(direct.values()), direct, modules
+
+@pytest.mark.parametrize("page", PAGES)
+def test_page_import_budget(page):
+    total, direct, modules = measure_imports(top_level_imports(os.path.join(ROOT, page)), ROOT)
+    deferred = sorted({name.split(".")[0] for name in modules} & set(DEFERRED_MODULES))
+    assert not deferred, f"{page} loads {', '.join(deferred)} at startup"
+    slowest = ", ".join(f"{name} {seconds:.2f} s" for name, seconds in sorted(direct.items(), key=lambda item: -item[1])[:5])
+    assert total <= PAGE_BUDGET_SECONDS, f"{page} imports take {total:.2f} s, over the {PAGE_BUDGET_SECONDS:g} s budget ({slowest})"
@@ -0,0 +1,49 @@
+"""
+Copyright (c) 2024-2025 ROCK LAB PRIVATE LIMITED
+This file is part of "The Stress App" project and is released under the
+GNU Affero General Public License v3.0 (AGPL-3.0)
+See the GNU Affero General Public License for more details: <https://www.gnu.org/licenses/agpl-3.0.html>
+"""
+
+# The LAS download is written block by block from the output table; it must match the
+# LAS that lasio writes for plotPPzhang digit for digit.
+
+import io
+
+import lasio
+import numpy as np
+import pandas as pd
+import pytest
+
+from common_functions import compact_frame, export_las
+from geomech import las_chunks, las_header
+
+def output_las():
+    """
+    A model-like output, with psi pressures, a nan and 0.1524 m depth steps, and the LAS lasio writes for it.
+    """
+    depth = np.arange(0.1524, 300.0, 0.1524)
+    rng = np.random.default_rng(7)
+    frame = pd.DataFrame({
+        "DEPT": depth,
+        "PP": 1000 + 4000 * rng.random(len(depth)),
+        "GR": 150 * rng.random(len(depth)),
+    })
+    frame.loc[5, "PP"] = np.nan
+    las = lasio.LASFile()
+    las.append_curve("DEPT", frame["DEPT"].to_numpy(), unit="m")
+    las.append_curve("PP", frame["PP"].to_numpy(), unit="psi")
+    las.append_curve("GR", frame["GR"].to_numpy(), unit="gAPI")
+    text = io.StringIO()
+    las.write(text, version=2.0)
+    return frame, text.getvalue()
+
+@pytest.mark.parametrize("block_rows", [1, 7, 2000])
+def test_las_chunks_match_lasio(block_rows):
+    frame, text = output_las()
+    assert "".join(las_chunks(las_header(text), frame, block_rows=block_rows)) == text
+
+def test_export_las_from_session_store():
+    frame, text = output_las()
+    store = compact_frame(frame, float32=False)
+    assert export_las(store, las_header(text)).getvalue().decode("utf-8") == text
@@ -0,0 +1,40 @@
+"""
+Copyright (c) 2024-2025 ROCK LAB PRIVATE LIMITED
+This file is part of "The Stress App" project and is released under the
+GNU Affero General Public License v3.0 (AGPL-3.0)
+See the GNU Affero General Public License for more details: <https://www.gnu.org/licenses/agpl-3.0.html>
+"""
+
+# A Parquet export re-imported on the Import page must give back the exact depths and curves.
+
+import io
+
+import lasio
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+
+from common_functions import compact_frame, export_parquet, load_well
+from geomech import las_header
+
+def test_parquet_round_trip():
+    depth = np.arange(0.1524, 300.0, 0.1524)
+    rng = np.random.default_rng(3)
+    frame = pd.DataFrame({
+        "DEPT": depth,
+        "MD": depth,
+        "TVDM": depth * 0.97,
+        "PP": 1000 + 4000 * rng.random(len(depth)),
+    })
+    frame.loc[5, "PP"] = np.nan
+    las = lasio.LASFile()
+    for name, unit in [("DEPT", "m"), ("MD", "m"), ("TVDM", "m"), ("PP", "psi")]:
+        las.append_curve(name, frame[name].to_numpy(), unit=unit)
+    text = io.StringIO()
+    las.write(text, version=2.0)
+    content = export_parquet("round-trip", compact_frame(frame, float32=False), las_header(text.getvalue()))
+    pd.testing.assert_frame_equal(pq.read_table(io.BytesIO(content)).to_pandas(), frame)
+    well = load_well(content)
+    for name in ["MD", "TVDM", "PP"]:
+        np.testing.assert_array_equal(well.data[name].basis, depth)
+        np.testing.assert_array_equal(well.data[name].values, frame[name].to_numpy())